@@ -0,0 +1,374 @@
+"""Benchmark y regresión de relevancia del motor de búsqueda (sin Tk y sin red)
+
+Uso:
+    python benchmark_biodiversidad.py
+    python benchmark_biodiversidad.py --modes bm25 tfidf --scale 10000 100000
+    python benchmark_biodiversidad.py --json resultados.json
+    python benchmark_biodiversidad.py --baseline resultados.json
+    python benchmark_biodiversidad.py --modes bm25 --fuzzy-terms 100000
+    python benchmark_biodiversidad.py --modes bm25 --startup --first-query-target 250
+"""
+import argparse
+import contextlib
+import itertools
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from chatbot_biodiversidad import ConversationLog, EXAMPLE_QUERIES, FuzzyTermIndex, QueryProcessor, SearchEngine
+
+# Conjunto de referencia: consulta -> fragmentos (sin tildes, en minúsculas) que debe contener una respuesta relevante
+GOLD_SET = {
+    "jaguar": ["jaguar"],
+    "condor andino": ["condor"],
+    "oso andino habitat": ["oso andino", "jucumari"],
+    "¿Dónde vive el jaguar en Bolivia?": ["jaguar"],
+    "Características del cóndor andino": ["condor"],
+    "Hábitat del oso andino en los Yungas": ["oso andino", "jucumari"],
+    "Especies en peligro de extinción": ["extincion", "amenazad", "peligro"],
+    "animales en extincion": ["extincion", "amenazad", "peligro"],
+    "Estado de conservación del armadillo gigante": ["armadillo"],
+    "Especies endémicas del Lago Titicaca": ["titicaca"],
+    "Biodiversidad del Parque Nacional Madidi": ["madidi"],
+    "paraba frente roja": ["paraba frente roja"],
+    "delfin rosado": ["delfin"],
+    "puya raimondi": ["raimondi"],
+    "alpaca": ["alpaca"],
+    "quinua": ["quinua"],
+    "vicuña": ["vicuña", "vicuna"],
+    "flora": ["flora", "planta"],
+    "parques nacionales": ["parque nacional", "parques nacionales", "areas protegidas"],
+    "caiman negro": ["caiman"]
+}
+
+# Dependencias pesadas que importar chatbot_biodiversidad no debe cargar (se importan en el primer uso)
+LAZY_MODULES = ('tkinter', 'requests', 'bs4', 'pypdf', 'numpy', 'wsgiref')
+
+# Arranque en frío en un proceso nuevo: importa el módulo, publica el snapshot en segundo plano
+# (como la interfaz y `--server --warm-start`) y mide hasta la primera respuesta y hasta la base lista
+STARTUP_SCRIPT = """
+import json, sys, threading, time
+start = time.perf_counter()
+import chatbot_biodiversidad as chatbot
+imported = time.perf_counter()
+loaded = sorted({name.split('.')[0] for name in sys.modules} & set(sys.argv[3:]))
+engine = chatbot.SearchEngine(snapshot_path=sys.argv[1], scrape=False, autoload=False)
+threading.Thread(target=engine.warm_up, daemon=True).start()
+while not len(engine.state):
+    time.sleep(0.0005)
+engine.search(sys.argv[2])
+answered = time.perf_counter()
+engine.ready.wait()
+ready = time.perf_counter()
+print(json.dumps({'import_ms': (imported - start) * 1000, 'first_query_ms': (answered - start) * 1000,
+                  'ready_ms': (ready - start) * 1000, 'loaded': loaded}))
+"""
+
+# Vocabulario para el corpus sintético
+SPECIES = ["jaguar", "cóndor andino", "oso andino", "paraba frente roja", "armadillo gigante",
+           "delfín rosado", "rana gigante", "vicuña", "taruca", "caimán negro", "águila harpía",
+           "flamenco andino", "vizcacha", "gato andino", "puya raimondi", "quinua"]
+REGIONS = ["la Amazonía", "el Altiplano", "los Yungas", "el Chaco", "el Lago Titicaca",
+           "el Parque Nacional Madidi", "la Chiquitania", "el Pantanal", "los valles interandinos"]
+VERBS = ["habita en", "se alimenta en", "está amenazado en", "se reproduce en", "fue registrado en",
+         "es endémico de", "migra hacia", "es abundante en"]
+
+def percentile(values, fraction):
+    """Percentil por rango más cercano de una lista ordenada"""
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, max(0, int(round(fraction * len(values) + 0.5)) - 1))
+    return values[index]
+
+def load_logged_questions(log=None):
+    """Preguntas registradas en el historial de conversaciones (formato anterior y JSON Lines)"""
+    log = log or ConversationLog()
+    return [turn['question'] for turn in log.iter_turns() if turn.get('question')]
+
+def replay_queries():
+    """Consultas de la ventana de ejemplos más las preguntas registradas"""
+    queries = [query for section in EXAMPLE_QUERIES.values() for query in section]
+    return queries + load_logged_questions()
+
+def synthetic_sentences(count, seed=13, vocabulary_size=20000):
+    """Genera oraciones sintéticas reproducibles con vocabulario de distribución Zipf"""
+    rng = random.Random(seed)
+    syllables = ["ca", "ma", "ri", "to", "lu", "pe", "sa", "qui", "na", "ya", "chu", "ti", "ro", "ba"]
+    vocabulary = sorted({''.join(rng.choice(syllables) for _ in range(rng.randint(2, 4)))
+                         for _ in range(vocabulary_size)})
+    rng.shuffle(vocabulary)
+    # Pesos acumulados una sola vez: con weights=, choices() los recalcula en cada llamada
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+    
+    for _ in range(count):
+        filler = ' '.join(rng.choices(vocabulary, cum_weights=cum_weights, k=rng.randint(4, 12)))
+        yield f"El {rng.choice(SPECIES)} {rng.choice(VERBS)} {rng.choice(REGIONS)} {filler}"
+
+def synthetic_vocabulary(count, seed=17):
+    """Vocabulario reproducible de palabras con sílabas del español (consonante + vocal)"""
+    rng = random.Random(seed)
+    syllables = [c + v for c in "bcdfghjlmnpqrstvyzñ" for v in "aeiou"] + list("aeiou")
+    vocabulary = {}
+    while len(vocabulary) < count:
+        vocabulary[''.join(rng.choice(syllables) for _ in range(rng.randint(2, 5)))] = None
+    return list(vocabulary)
+
+def misspell(word, edits, rng):
+    """Aplica `edits` errores de tipeo al azar: borrado, cambio, inserción o transposición"""
+    for _ in range(edits):
+        i = rng.randrange(len(word))
+        operation = rng.randrange(4)
+        if operation == 0 and len(word) > 3:
+            word = word[:i] + word[i + 1:]
+        elif operation == 1:
+            word = word[:i] + rng.choice("aeioulmnrst") + word[i + 1:]
+        elif operation == 2 and i < len(word) - 1:
+            word = word[:i] + word[i + 1] + word[i] + word[i + 2:]
+        else:
+            word = word[:i] + rng.choice("aeioulmnrst") + word[i:]
+    return word
+
+def measure_fuzzy(size, trace_memory, samples=1000, seed=23):
+    """Construcción, memoria, latencia y recall de FuzzyTermIndex sobre un vocabulario sintético"""
+    vocabulary = synthetic_vocabulary(size)
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    speller = FuzzyTermIndex(vocabulary)
+    build_time = time.perf_counter() - start
+    peak = None
+    if trace_memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    
+    rng = random.Random(seed)
+    result = {'mode': 'fuzzy', 'corpus': size, 'build_s': build_time,
+              'peak_mb': peak / 2 ** 20 if peak is not None else None,
+              'index_mb': speller.nbytes / 2 ** 20}
+    for edits in (1, 2):
+        latencies, found = [], 0
+        for word in rng.sample(vocabulary, samples):
+            typo = misspell(word, edits, rng)
+            start = time.perf_counter()
+            matches = speller.lookup(typo, edits)
+            latencies.append(time.perf_counter() - start)
+            found += any(match == word for match, _ in matches)
+        latencies.sort()
+        result[f'd{edits}_p50_us'] = percentile(latencies, 0.50) * 1e6
+        result[f'd{edits}_p95_us'] = percentile(latencies, 0.95) * 1e6
+        result[f'd{edits}_recall'] = found / samples
+    
+    peak = f"{result['peak_mb']:.1f} MB" if peak is not None else "-"
+    print(f"  fuzzy | {size:>8} términos | build {build_time:.2f} s | mem {peak} | "
+          f"variantes {result['index_mb']:.1f} MB | "
+          f"d1 p50 {result['d1_p50_us']:.0f} µs / p95 {result['d1_p95_us']:.0f} µs (recall {result['d1_recall']:.3f}) | "
+          f"d2 p50 {result['d2_p50_us']:.0f} µs / p95 {result['d2_p95_us']:.0f} µs (recall {result['d2_recall']:.3f})")
+    return result
+
+def parse_importtime(report, module='chatbot_biodiversidad'):
+    """Importaciones directas de `module` con su tiempo acumulado (ms), de la salida de -X importtime"""
+    children, result = [], {}
+    for line in report.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 1:
+            children.append((name.strip(), int(cumulative) / 1000))
+        elif depth == 0:
+            if name.strip() == module:
+                result = dict(children)
+            children = []
+    return result
+
+def measure_startup(target_ms, query="jaguar", top=5):
+    """Tiempo hasta la primera respuesta en un proceso nuevo, con el desglose de importaciones"""
+    with tempfile.TemporaryDirectory() as directory:
+        snapshot_path = os.path.join(directory, 'snapshot.json')
+        engine = SearchEngine(snapshot_path=snapshot_path, scrape=False, autoload=False)
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            engine.setup_knowledge_base(force=True)
+            engine.save_snapshot()
+        
+        completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', STARTUP_SCRIPT,
+                                    snapshot_path, query, *LAZY_MODULES],
+                                   cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True,
+                                   encoding='utf-8', env=dict(os.environ, PYTHONIOENCODING='utf-8'), check=True)
+    
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    imports = parse_importtime(completed.stderr)
+    result.update({'mode': 'startup', 'corpus': 'local', 'sentences': len(engine.state), 'target_ms': target_ms,
+                   'imports_ms': dict(sorted(imports.items(), key=lambda item: -item[1])[:top])})
+    
+    slowest = ", ".join(f"{name} {ms:.1f} ms" for name, ms in result['imports_ms'].items())
+    print(f"arranque | {result['sentences']:>8} oraciones | import {result['import_ms']:.1f} ms | "
+          f"primera respuesta {result['first_query_ms']:.1f} ms (objetivo {target_ms:.0f} ms) | "
+          f"base lista {result['ready_ms']:.1f} ms")
+    print(f"         | importaciones más costosas: {slowest}")
+    if result['loaded']:
+        print(f"⚠️ Dependencias cargadas al importar: {', '.join(result['loaded'])}")
+    return result
+
+def build_engine(mode, corpus):
+    """Motor construido con el corpus local (corpus=None) o con oraciones sintéticas ya generadas"""
+    engine = SearchEngine(mode, snapshot_path=None, scrape=False, autoload=False)
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        if corpus is not None:
+            engine.publish_state(engine.build_state((sentence, None) for sentence in corpus))
+        else:
+            engine.setup_knowledge_base(force=True)
+    return engine
+
+def measure_build(mode, corpus, trace_memory):
+    """Tiempo de construcción y, opcionalmente, memoria máxima en una segunda construcción
+    
+    El corpus sintético se genera antes: ni el tiempo ni la memoria incluyen su generación.
+    """
+    start = time.perf_counter()
+    engine = build_engine(mode, corpus)
+    build_time = time.perf_counter() - start
+    
+    peak = None
+    if trace_memory:
+        tracemalloc.start()
+        build_engine(mode, corpus)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return engine, build_time, peak
+
+def measure_queries(engine, queries, rounds, warm_cache):
+    """Latencias por consulta (en segundos) replicando el camino de search()"""
+    latencies = []
+    engine.metrics.clear()
+    for _ in range(rounds):
+        for query in queries:
+            if not warm_cache:
+                engine.cache.clear()
+            start = time.perf_counter()
+            engine.search(query)
+            latencies.append(time.perf_counter() - start)
+    return sorted(latencies)
+
+def measure_relevance(engine, gold_set, depth=10):
+    """Exactitud top-1 y MRR contra el conjunto de referencia"""
+    hits_at_1 = 0
+    reciprocal_ranks = []
+    for query, fragments in gold_set.items():
+        rank = 0
+        for position, (sentence, _) in enumerate(engine.search_top_k(query, depth), start=1):
+            folded = QueryProcessor.fold(sentence)
+            if any(QueryProcessor.fold(fragment) in folded for fragment in fragments):
+                rank = position
+                break
+        hits_at_1 += rank == 1
+        reciprocal_ranks.append(1 / rank if rank else 0.0)
+    return hits_at_1 / len(gold_set), sum(reciprocal_ranks) / len(gold_set)
+
+def run(modes, scales, rounds, warm_cache, trace_memory):
+    """Ejecuta el benchmark para cada combinación de modo y tamaño de corpus"""
+    queries = replay_queries()
+    results = []
+    for scale in scales:
+        # Un mismo corpus para todos los modos, generado fuera de la medición
+        corpus = list(synthetic_sentences(scale)) if scale else None
+        for mode in modes:
+            engine, build_time, peak = measure_build(mode, corpus, trace_memory)
+            latencies = measure_queries(engine, queries, rounds, warm_cache)
+            result = {
+                'mode': mode,
+                'corpus': scale or 'local',
+                'sentences': len(engine.state),
+                'build_s': build_time,
+                'peak_mb': peak / 2 ** 20 if peak is not None else None,
+                'store_mb': engine.store.nbytes / 2 ** 20,
+                'p50_ms': percentile(latencies, 0.50) * 1000,
+                'p95_ms': percentile(latencies, 0.95) * 1000,
+                'p99_ms': percentile(latencies, 0.99) * 1000,
+                'qps': len(latencies) / sum(latencies) if latencies else 0.0,
+                # Promedio por etapa medido por el propio motor (normalize, retrieve, score, fallback)
+                'stages_ms': engine.metrics.stats()['mean_ms']
+            }
+            if not scale:
+                # La relevancia solo tiene sentido sobre el corpus real
+                result['top1'], result['mrr'] = measure_relevance(engine, GOLD_SET)
+            results.append(result)
+            print_result(result)
+    return results
+
+def print_result(result):
+    """Una fila de resultados legible"""
+    peak = f"{result['peak_mb']:.1f} MB" if result['peak_mb'] is not None else "-"
+    relevance = (f" | top-1 {result['top1']:.2f} | MRR {result['mrr']:.2f}"
+                 if 'top1' in result else "")
+    print(f"{result['mode']:>7} | {str(result['corpus']):>8} | {result['sentences']:>8} oraciones | "
+          f"build {result['build_s']:.2f} s | mem {peak} | store {result['store_mb']:.1f} MB | p50 {result['p50_ms']:.3f} ms | "
+          f"p95 {result['p95_ms']:.3f} ms | p99 {result['p99_ms']:.3f} ms | "
+          f"{result['qps']:.0f} qps{relevance}")
+
+def check_baseline(results, path, tolerance):
+    """Compara la relevancia con un resultado anterior; devuelve la lista de regresiones"""
+    with open(path, 'r', encoding='utf-8') as f:
+        baseline = {(r['mode'], str(r['corpus'])): r for r in json.load(f)}
+    
+    regressions = []
+    for result in results:
+        previous = baseline.get((result['mode'], str(result['corpus'])))
+        if not previous or 'top1' not in result:
+            continue
+        for metric in ('top1', 'mrr'):
+            if result[metric] < previous.get(metric, 0) - tolerance:
+                regressions.append(f"{result['mode']}: {metric} {previous[metric]:.3f} -> {result[metric]:.3f}")
+    return regressions
+
+def main(argv=None):
+    """Punto de entrada del benchmark"""
+    parser = argparse.ArgumentParser(description="Benchmark del motor de búsqueda de biodiversidad")
+    parser.add_argument('--modes', nargs='+', default=list(SearchEngine.SCORING_MODES),
+                        choices=SearchEngine.SCORING_MODES)
+    parser.add_argument('--scale', nargs='*', type=int, default=[],
+                        help="Tamaños de corpus sintético (p. ej. 10000 100000 1000000)")
+    parser.add_argument('--rounds', type=int, default=5, help="Repeticiones de las consultas")
+    parser.add_argument('--warm-cache', action='store_true', help="No vaciar la caché entre consultas")
+    parser.add_argument('--no-memory', action='store_true', help="Omitir la medición con tracemalloc")
+    parser.add_argument('--fuzzy-terms', type=int, nargs='?', const=100000, default=0,
+                        help="Medir la corrección de términos sobre un vocabulario sintético (100000 por defecto)")
+    parser.add_argument('--startup', action='store_true',
+                        help="Medir el arranque en frío (importaciones y tiempo hasta la primera respuesta)")
+    parser.add_argument('--first-query-target', type=float, default=250.0,
+                        help="Objetivo en ms para la primera respuesta con --startup")
+    parser.add_argument('--json', help="Guardar los resultados en un archivo JSON")
+    parser.add_argument('--baseline', help="JSON anterior contra el que comparar la relevancia")
+    parser.add_argument('--tolerance', type=float, default=0.02)
+    args = parser.parse_args(argv)
+    
+    results = run(args.modes, [0] + args.scale, args.rounds, args.warm_cache, not args.no_memory)
+    if args.fuzzy_terms:
+        results.append(measure_fuzzy(args.fuzzy_terms, not args.no_memory))
+    if args.startup:
+        results.append(measure_startup(args.first_query_target))
+    
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    
+    if args.baseline:
+        regressions = check_baseline(results, args.baseline, args.tolerance)
+        for regression in regressions:
+            print(f"❌ Regresión de relevancia: {regression}")
+        if regressions:
+            return 1
+    
+    startup = next((result for result in results if result['mode'] == 'startup'), None)
+    if startup and startup['first_query_ms'] > startup['target_ms']:
+        print(f"❌ Arranque lento: primera respuesta en {startup['first_query_ms']:.1f} ms "
+              f"(objetivo {startup['target_ms']:.0f} ms)")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,16 +1,119 @@
-import tkinter as tk
-from tkinter import scrolledtext, ttk, messagebox
+import argparse
+import bisect
+import csv
+import hashlib
+import heapq
+import itertools
 import json
+import logging
+import math
+import mmap
 import os
+import queue
+import random
 import re
-import requests
-from bs4 import BeautifulSoup
+import signal
+import struct
+import sys
+import threading
+from array import array
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from urllib.parse import parse_qs
 import time
+import zlib
+
+# Dependencias que se importan en el primer uso, para que el arranque solo pague lo que necesita:
+# Tk solo con la interfaz, requests/bs4 solo al scrapear, pypdf al extraer PDFs y NumPy al construir
+tk = scrolledtext = ttk = messagebox = None
+requests = BeautifulSoup = None
+np = None  # False si NumPy no está instalado (solo es obligatorio para el modo 'tfidf')
+PdfReader = None  # False si pypdf no está instalado (solo hace falta para volver a extraer PDFs)
+
+def import_tkinter():
+    """Importa Tk al abrir la interfaz gráfica (el servicio HTTP y el benchmark no lo necesitan)"""
+    global tk, scrolledtext, ttk, messagebox
+    import tkinter as tk
+    from tkinter import scrolledtext, ttk, messagebox
+
+def import_scraping():
+    """Importa requests y BeautifulSoup la primera vez que hay que descargar o procesar una página"""
+    global requests, BeautifulSoup
+    if BeautifulSoup is None:
+        import requests
+        from bs4 import BeautifulSoup
+
+def import_numpy():
+    """Importa NumPy la primera vez que se necesita; devuelve None si no está instalado"""
+    global np
+    if np is None:
+        try:
+            import numpy as np
+        except ImportError:
+            np = False
+    return np or None
+
+def import_pdf_reader():
+    """Importa pypdf la primera vez que se necesita; devuelve None si no está instalado"""
+    global PdfReader
+    if PdfReader is None:
+        try:
+            from pypdf import PdfReader
+        except ImportError:
+            PdfReader = False
+    return PdfReader or None
 
 # Configuración
 DATA_PATH = "data/"
-SENTENCES_DB = os.path.join(DATA_PATH, "biodiversidad_sentences.json")
+SENTENCES_DB = os.path.join(DATA_PATH, "biodiversidad_sentences.json")  # Oraciones curadas (fuente, versionada)
+SNAPSHOT_PATH = os.path.join(DATA_PATH, "knowledge_snapshot.json")  # Base generada (no versionada)
+SCRAPE_CACHE = os.path.join(DATA_PATH, "scraping_cache.json")
+CONVERSATION_MEMORY = os.path.join(DATA_PATH, "conversation_memory.json")  # Formato anterior (solo lectura)
+CONVERSATION_LOG = os.path.join(DATA_PATH, "conversation_memory.jsonl")
+
+# PDFs locales y base de oraciones extraídas de ellos
+PDF_FILES = [os.path.join(DATA_PATH, "PDF1.pdf"), os.path.join(DATA_PATH, "PDF2.pdf")]
+PDF_SENTENCES_DB = os.path.join(DATA_PATH, "sentences_database.json")  # Versionada (solo lectura)
+PDF_EXTRACT_CACHE = os.path.join(DATA_PATH, "pdf_sentences_cache.json")  # Re-extracciones (no versionada)
+PDF_DB_VERSION = 2
+
+# Corpus estructurado de páginas scrapeadas (también existe en CSV)
+CORPUS_FILES = [os.path.join(DATA_PATH, "biodiversidad_bolivia.json")]
+
+# Consultas de ejemplo (ventana "Ejemplos" y benchmark)
+EXAMPLE_QUERIES = {
+    'Consultas Sencillas': [
+        "jaguar",
+        "condor",
+        "oso andino",
+        "animales peligro",
+        "amazonia",
+        "parques nacionales"
+    ],
+    'Consultas Elaboradas': [
+        "¿Dónde vive el jaguar en Bolivia?",
+        "Características del cóndor andino",
+        "Hábitat del oso andino en los Yungas",
+        "Especies en peligro de extinción",
+        "Animales de la Amazonía boliviana",
+        "Flora del altiplano andino"
+    ],
+    'Consultas Técnicas': [
+        "Estado de conservación del armadillo gigante",
+        "Especies endémicas del Lago Titicaca",
+        "Biodiversidad del Parque Nacional Madidi",
+        "Aves migratorias de Bolivia",
+        "Plantas medicinales de los Yungas"
+    ]
+}
+
+# Registro de búsquedas (nivel DEBUG) y de métricas; sin configurar no imprime nada
+logger = logging.getLogger('ecochatbot')
+
+# Snapshot de la base de conocimiento
+SNAPSHOT_VERSION = 6
+SNAPSHOT_MAX_AGE = 7 * 24 * 3600  # Segundos antes de considerar desactualizadas las fuentes
 
 # URLs para web scraping
 SCRAPING_URLS = [
@@ -19,42 +122,209 @@ SCRAPING_URLS = [
     "https://www.faunabolivia.com/"       # Portal de fauna boliviana
 ]
 
+# Entidades reconocidas al indexar: categoría -> {nombre canónico: alias (nombres comunes y científicos)}
+# Los nombres científicos entre paréntesis que no estén aquí se descubren al leer las oraciones
+ENTITY_GAZETTEER = {
+    'especies': {
+        'jaguar': ['jaguar', 'yaguar', 'tigre americano', 'panthera onca'],
+        'cóndor andino': ['cóndor', 'cóndor andino', 'vultur gryphus'],
+        'oso andino': ['oso andino', 'jucumari', 'oso de anteojos', 'tremarctos ornatus'],
+        'paraba frente roja': ['paraba frente roja', 'ara rubrogenys'],
+        'paraba barba azul': ['paraba barba azul', 'ara glaucogularis'],
+        'paraba azul': ['paraba azul', 'guacamayo jacinto', 'anodorhynchus hyacinthinus'],
+        'delfín rosado': ['delfín rosado', 'bufeo', 'inia boliviensis', 'inia geoffrensis'],
+        'rana gigante del Titicaca': ['rana gigante', 'huankele', 'telmatobius culeus'],
+        'armadillo gigante': ['armadillo gigante', 'pejichi', 'priodontes maximus'],
+        'vicuña': ['vicuña', 'vicugna vicugna'],
+        'alpaca': ['alpaca', 'vicugna pacos'],
+        'llama': ['lama glama'],  # "llama" sola también es verbo
+        'guanaco': ['guanaco', 'lama guanicoe'],
+        'puma': ['puma', 'león de montaña', 'puma concolor'],
+        'gato andino': ['gato andino', 'leopardus jacobita'],
+        'ocelote': ['ocelote', 'leopardus pardalis'],
+        'tapir': ['tapir', 'anta', 'tapirus terrestris'],
+        'londra': ['londra', 'nutria gigante', 'pteronura brasiliensis'],
+        'pecarí quimilero': ['pecarí quimilero', 'pecarí quilimero', 'catagonus wagneri'],
+        'caimán negro': ['caimán negro', 'melanosuchus niger'],
+        'yacaré': ['yacaré', 'caiman yacare'],
+        'flamenco': ['flamenco', 'parina', 'phoenicopterus andinus', 'phoenicopterus chilensis',
+                     'phoenicopterus jamesi'],
+        'ñandú': ['ñandú', 'suri', 'rhea pennata', 'rhea americana'],
+        'taruca': ['taruca', 'hippocamelus antisensis'],
+        'vizcacha': ['vizcacha', 'lagidium viscacia'],
+        'águila harpía': ['águila harpía', 'harpia harpyja'],
+        'zorro andino': ['zorro andino', 'zorro colorado', 'pseudalopex culpaeus'],
+        'puya raimondi': ['puya raimondi', 'titanca', 'puya raimondii'],
+        'quinua': ['quinua', 'quinoa', 'chenopodium quinoa'],
+        'kantuta': ['kantuta', 'cantua buxifolia'],
+        'totora': ['totora', 'schoenoplectus californicus'],
+        'ichu': ['ichu', 'paja brava', 'stipa ichu']
+    },
+    'regiones': {
+        'Amazonía': ['amazonía', 'amazónico', 'amazónica'],
+        'Altiplano': ['altiplano', 'altiplánico', 'puna'],
+        'Yungas': ['yungas'],
+        'Chaco': ['chaco', 'chaqueño'],
+        'Lago Titicaca': ['titicaca'],
+        'Parque Nacional Madidi': ['madidi'],
+        'Chiquitania': ['chiquitania', 'chiquitano'],
+        'Pantanal': ['pantanal'],
+        'Parque Nacional Noel Kempff Mercado': ['noel kempff'],
+        'Andes': ['andes'],
+        'valles interandinos': ['valles interandinos', 'valle interandino', 'valles secos'],
+        'Salar de Uyuni': ['uyuni'],
+        'Llanos de Moxos': ['llanos de moxos', 'beni']
+    },
+    'estado': {
+        'en peligro crítico': ['peligro crítico', 'críticamente amenazada'],
+        'en peligro': ['en peligro', 'peligro de extinción', 'amenazada', 'amenazado', 'extinción'],
+        'vulnerable': ['vulnerable'],
+        'casi amenazado': ['casi amenazado']
+    }
+}
+
 class WebScraper:
-    def __init__(self):
-        self.session = requests.Session()
-        self.session.headers.update({
+    def __init__(self, urls=None, cache_path=SCRAPE_CACHE, max_workers=4,
+                 timeout=10, timeouts=None, retries=2, backoff=0.5):
+        self.urls = list(urls) if urls is not None else list(SCRAPING_URLS)
+        self.cache_path = cache_path
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.timeouts = timeouts or {}  # Timeout específico por URL
+        self.retries = retries
+        self.backoff = backoff
+        self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        })
+        }
+        self.local = threading.local()
+        self.cache = self.load_cache()
     
-    def scrape_wikipedia(self):
-        """Scraping de Wikipedia sobre flora y fauna de Bolivia"""
+    @property
+    def session(self):
+        """Una sesión HTTP por hilo (requests.Session no es thread-safe)"""
+        session = getattr(self.local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.headers.update(self.headers)
+            self.local.session = session
+        return session
+    
+    def load_cache(self):
+        """Carga ETag/Last-Modified y oraciones de la última descarga de cada URL"""
+        if not self.cache_path:
+            return {}
         try:
-            print("🔍 Scrapeando Wikipedia...")
-            url = SCRAPING_URLS[0]
-            response = self.session.get(url, timeout=10)
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
-            # Extraer contenido principal
-            content = soup.find('div', {'class': 'mw-parser-output'})
-            if not content:
-                return []
-            
-            sentences = []
-            # Extraer párrafos y listas
-            for element in content.find_all(['p', 'li']):
-                text = element.get_text().strip()
-                if len(text) > 50 and any(keyword in text.lower() for keyword in 
-                                         ['bolivia', 'boliviana', 'andino', 'amazon']):
-                    clean_text = self.clean_text(text)
-                    if clean_text:
-                        sentences.append(clean_text)
-            
-            print(f"✅ Wikipedia: {len(sentences)} oraciones encontradas")
-            return sentences[:20]  # Limitar a 20 oraciones
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+    
+    def save_cache(self):
+        """Guarda los metadatos de descarga para los próximos GET condicionales"""
+        if not self.cache_path:
+            return
+        try:
+            tmp_path = self.cache_path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.cache, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            print(f"⚠️ No se pudo guardar la caché de scraping: {e}")
+    
+    def fetch(self, url):
+        """GET condicional con reintentos y backoff exponencial; devuelve la respuesta"""
+        import_scraping()
+        headers = {}
+        cached = self.cache.get(url, {})
+        if cached.get('etag'):
+            headers['If-None-Match'] = cached['etag']
+        if cached.get('last_modified'):
+            headers['If-Modified-Since'] = cached['last_modified']
+        
+        timeout = self.timeouts.get(url, self.timeout)
+        for attempt in range(self.retries + 1):
+            try:
+                response = self.session.get(url, headers=headers, timeout=timeout)
+                # Solo se reintentan los errores del servidor
+                if response.status_code < 500:
+                    return response
+                error = requests.HTTPError(f"HTTP {response.status_code}")
+            except requests.RequestException as e:
+                error = e
             
-        except Exception as e:
-            print(f"❌ Error scraping Wikipedia: {e}")
+            if attempt < self.retries:
+                time.sleep(self.backoff * 2 ** attempt)
+        
+        raise error
+    
+    def scrape_url(self, url):
+        """Descarga y procesa una URL; reutiliza la caché si el servidor responde 304
+        
+        Devuelve (url, entrada de caché, oraciones); la entrada es None si la fuente no respondió.
+        """
+        cached = self.cache.get(url, {})
+        try:
+            response = self.fetch(url)
+            if response.status_code == 304 and 'sentences' in cached:
+                print(f"♻️ Sin cambios (304): {url}")
+                return url, cached, cached['sentences']
+            response.raise_for_status()
+        except requests.RequestException as e:
+            print(f"❌ Error scraping {url}: {e}")
+            # Sin red se usan las últimas oraciones conocidas
+            return url, None, cached.get('sentences', [])
+        
+        sentences = self.parse_html(response.content)
+        entry = {
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'fetched_date': datetime.now().isoformat(),
+            'sentences': sentences
+        }
+        print(f"✅ {url}: {len(sentences)} oraciones encontradas")
+        return url, entry, sentences
+    
+    def scrape_all(self):
+        """Descarga todas las URLs en paralelo
+        
+        Devuelve sus (oración, fuente) en orden y cuántas fuentes respondieron (200 o 304);
+        las que fallaron aportan las oraciones de la caché.
+        """
+        print(f"🔍 Scrapeando {len(self.urls)} fuentes en paralelo...")
+        import_scraping()
+        results = {}
+        answered = 0
+        with ThreadPoolExecutor(max_workers=max(1, self.max_workers)) as executor:
+            for url, entry, sentences in executor.map(self.scrape_url, self.urls):
+                if entry is not None:
+                    self.cache[url] = entry
+                    answered += 1
+                results[url] = sentences
+        
+        self.save_cache()
+        return [(sentence, SourceInfo(url)) for url in self.urls for sentence in results[url]], answered
+    
+    def parse_html(self, content):
+        """Extrae oraciones relevantes de una página (contenido de Wikipedia o cuerpo genérico)"""
+        import_scraping()
+        soup = BeautifulSoup(content, 'html.parser')
+        
+        # Extraer contenido principal
+        content = soup.find('div', {'class': 'mw-parser-output'}) or soup.body
+        if not content:
             return []
+        
+        sentences = []
+        # Extraer párrafos y listas
+        for element in content.find_all(['p', 'li']):
+            text = element.get_text().strip()
+            if len(text) > 50 and any(keyword in text.lower() for keyword in 
+                                     ['bolivia', 'boliviana', 'andino', 'amazon']):
+                clean_text = self.clean_text(text)
+                if clean_text:
+                    sentences.append(clean_text)
+        
+        return sentences[:20]  # Limitar a 20 oraciones
     
     def scrape_biodiversidad_gob(self):
         """Scraping del portal de biodiversidad boliviano"""
@@ -104,7 +374,8 @@ class WebScraper:
             print(f"❌ Error scraping Fauna Bolivia: {e}")
             return []
     
-    def clean_text(self, text):
+    @staticmethod
+    def clean_text(text):
         """Limpia el texto extraído"""
         # Remover referencias [1], [2], etc.
         text = re.sub(r'\[\d+\]', '', text)
@@ -115,16 +386,349 @@ class WebScraper:
             return text
         return ""
 
+# Corridas de fragmentos cortos separados por espacios ("v e r t e b ra do s  e s  de")
+SPACED_RUN = re.compile(r'(?<!\S)\S{1,3}(?: {1,2}\S{1,3}(?!\S)){3,}')
+
+def repair_letter_spacing(line):
+    """Une las letras espaciadas de una línea de PDF ("V i d a  S i l v e s t r e" -> "Vida Silvestre")"""
+    def join_run(match):
+        run = match.group(0)
+        tokens = run.split()
+        singles = sum(len(token) == 1 for token in tokens)
+        if '  ' in run and len(tokens) >= 6 and singles * 2 >= len(tokens):
+            # Los espacios dobles separan palabras; los simples, letras de una misma palabra
+            return ' '.join(word.replace(' ', '') for word in re.split(r' {2,}', run))
+        if '  ' not in run and singles == len(tokens):
+            return ''.join(tokens)
+        return run
+    
+    return SPACED_RUN.sub(join_run, line)
+
+def split_pdf_text(text):
+    """Convierte el texto de una página de PDF en oraciones limpias"""
+    # Palabras cortadas con guion al final de línea
+    text = re.sub(r'-\n(?=[a-záéíóúñ])', '', text)
+    lines = [repair_letter_spacing(line) for line in text.split('\n')]
+    # Se descartan líneas sin letras (porcentajes, números de página)
+    text = ' '.join(line for line in lines if re.search(r'[^\W\d_]', line))
+    
+    sentences = []
+    for sentence in re.split(r'(?<=[.!?])\s+', text):
+        clean_text = WebScraper.clean_text(sentence)
+        if clean_text:
+            sentences.append(clean_text)
+    return sentences
+
+class SourceInfo:
+    """Origen de un documento: URL o archivo, título y desplazamiento (carácter o página)"""
+    __slots__ = ('url', 'title', 'offset')
+    
+    def __init__(self, url, title=None, offset=None):
+        self.url = url
+        self.title = title
+        self.offset = offset
+    
+    def citation(self):
+        """Texto para citar la fuente en una respuesta"""
+        if self.url.startswith('http'):
+            return f"🔗 Fuente: {self.title} - {self.url}" if self.title else f"🔗 Fuente: {self.url}"
+        page = f", pág. {self.offset + 1}" if self.offset is not None else ""
+        return f"📄 Fuente: {os.path.basename(self.url)}{page}"
+    
+    def to_list(self):
+        return [self.url, self.title, self.offset]
+    
+    @classmethod
+    def from_list(cls, data):
+        return cls(*data) if data else None
+
+def extract_pdf_pages(path, start, stop):
+    """Tarea del pool de procesos: (página, oración) de las páginas [start, stop) de un PDF"""
+    import_pdf_reader()
+    sentences = []
+    with open(path, 'rb') as f:
+        # Con un archivo abierto pypdf lee por desplazamientos en lugar de cargar todo el documento
+        reader = PdfReader(f)
+        for page_number in range(start, min(stop, len(reader.pages))):
+            for sentence in split_pdf_text(reader.pages[page_number].extract_text() or ''):
+                sentences.append((page_number, sentence))
+    return sentences
+
+class PdfIngestor:
+    """Extrae oraciones de los PDFs locales página por página, en paralelo entre páginas y archivos
+    
+    Las oraciones de cada PDF salen de la base versionada (db_path) o de la caché
+    generada (cache_path) mientras el tamaño del archivo coincida; solo los PDFs sin
+    oraciones guardadas se vuelven a extraer (con pypdf) y se guardan en cache_path.
+    """
+    def __init__(self, paths=None, db_path=PDF_SENTENCES_DB, cache_path=PDF_EXTRACT_CACHE, max_workers=None,
+                 pages_per_task=4):
+        self.paths = list(paths) if paths is not None else list(PDF_FILES)
+        self.db_path = db_path  # Solo se lee: se distribuye con el repositorio
+        self.cache_path = cache_path
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.pages_per_task = pages_per_task
+    
+    def iter_pages(self, path):
+        """Generador con el texto de cada página, sin cargar el documento completo"""
+        with open(path, 'rb') as f:
+            reader = PdfReader(f)
+            for page in reader.pages:
+                yield page.extract_text() or ''
+    
+    def tasks(self, paths):
+        """Divide los PDFs en bloques de páginas (archivo, inicio, fin)"""
+        for path in paths:
+            with open(path, 'rb') as f:
+                page_count = len(PdfReader(f).pages)
+            for start in range(0, page_count, self.pages_per_task):
+                yield path, start, start + self.pages_per_task
+    
+    def iter_extracted(self, paths):
+        """Extrae (oración, fuente) de los PDFs y las entrega en orden a medida que se procesan"""
+        if self.max_workers == 1:
+            for path in paths:
+                for page_number, text in enumerate(self.iter_pages(path)):
+                    for sentence in split_pdf_text(text):
+                        yield sentence, SourceInfo(path, offset=page_number)
+            return
+        
+        tasks = list(self.tasks(paths))
+        if not tasks:
+            return
+        from concurrent.futures import ProcessPoolExecutor
+        task_paths, starts, stops = zip(*tasks)
+        with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            for path, sentences in zip(task_paths, executor.map(extract_pdf_pages, task_paths, starts, stops)):
+                for page_number, sentence in sentences:
+                    yield sentence, SourceInfo(path, offset=page_number)
+    
+    def source_files(self):
+        """Tamaño de cada PDF, para detectar cambios (estable entre clones, a diferencia de la fecha)"""
+        return {path: os.path.getsize(path) for path in self.paths if os.path.exists(path)}
+    
+    def cached_sentences(self, files):
+        """{ruta: [(oración, página)]} de los PDFs cuyo tamaño coincide con la caché o la base guardada"""
+        cached = {}
+        for db_path in (self.cache_path, self.db_path):
+            if not db_path:
+                continue
+            try:
+                with open(db_path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                metadata = data.get('metadata', {})
+                if metadata.get('version') != PDF_DB_VERSION:
+                    continue
+                saved = metadata.get('files', {})
+                fresh = {path for path, size in files.items() if path not in cached and saved.get(path) == size}
+                found = {path: [] for path in fresh}
+                for sentence, (path, page_number) in zip(data['sentences'], data['pages']):
+                    if path in found:
+                        found[path].append((sentence, page_number))
+            except (OSError, ValueError, KeyError, TypeError, AttributeError):
+                continue
+            cached.update(found)
+        return cached
+    
+    def iter_sentences(self):
+        """(oración, fuente) de los PDFs: las guardadas si están al día; el resto se extrae (con pypdf) y se guarda"""
+        files = self.source_files()
+        cached = self.cached_sentences(files)
+        for path in self.paths:
+            for sentence, page_number in cached.get(path, ()):
+                yield sentence, SourceInfo(path, offset=page_number)
+        
+        missing = [path for path in self.paths if path in files and path not in cached]
+        if not missing:
+            return
+        if import_pdf_reader() is None:
+            print(f"⚠️ pypdf no está instalado: se omiten {len(missing)} PDFs sin oraciones guardadas")
+            return
+        
+        print(f"📄 Extrayendo oraciones de {len(missing)} PDFs...")
+        extracted = []
+        for sentence, source in self.iter_extracted(missing):
+            extracted.append((sentence, source.url, source.offset))
+            yield sentence, source
+        
+        print(f"✅ PDFs: {len(extracted)} oraciones")
+        saved = [(sentence, path, page_number) for path in self.paths
+                 for sentence, page_number in cached.get(path, ())] + extracted
+        self.save(saved, {path: files[path] for path in self.paths if path in cached or path in missing})
+    
+    def save(self, sentences, files):
+        """Guarda las oraciones (con archivo y página) en la caché generada; la base versionada no se toca"""
+        if not self.cache_path:
+            return
+        data = {
+            'metadata': {
+                'version': PDF_DB_VERSION,
+                'total_sentences': len(sentences),
+                'created_date': datetime.now().isoformat(),
+                'files': files
+            },
+            'sentences': [sentence for sentence, _, _ in sentences],
+            'pages': [[path, page_number] for _, path, page_number in sentences]
+        }
+        try:
+            tmp_path = self.cache_path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            print(f"⚠️ No se pudo guardar {self.cache_path}: {e}")
+
+def iter_json_array(path, chunk_size=1 << 16):
+    """Decodifica un arreglo JSON elemento por elemento, leyendo el archivo por bloques"""
+    decoder = json.JSONDecoder()
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        buffer = f.read(chunk_size).lstrip()
+        if not buffer.startswith('['):
+            raise ValueError(f"{path} no contiene un arreglo JSON")
+        buffer = buffer[1:]
+        
+        while True:
+            buffer = buffer.lstrip().lstrip(',').lstrip()
+            if buffer.startswith(']'):
+                return
+            try:
+                item, end = decoder.raw_decode(buffer)
+            except ValueError:
+                # El elemento quedó cortado: se lee el siguiente bloque
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    raise
+                buffer += chunk
+                continue
+            
+            yield item
+            buffer = buffer[end:]
+
+class CorpusLoader:
+    """Carga páginas scrapeadas (url, titulo, contenido...) y las divide en pasajes solapados"""
+    def __init__(self, paths=None, max_chars=300, min_chars=30, overlap=1):
+        self.paths = list(paths) if paths is not None else list(CORPUS_FILES)
+        self.max_chars = max_chars
+        self.min_chars = min_chars
+        self.overlap = overlap  # Oraciones compartidas entre pasajes consecutivos
+    
+    def source_files(self):
+        """Tamaño de cada archivo del corpus, para detectar cambios"""
+        return {path: os.path.getsize(path) for path in self.paths if os.path.exists(path)}
+    
+    def iter_records(self, path):
+        """Registros de un archivo .json (arreglo) o .csv, de a uno"""
+        if path.endswith('.csv'):
+            csv.field_size_limit(min(sys.maxsize, 2 ** 31 - 1))
+            with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+                yield from csv.DictReader(f)
+        else:
+            yield from iter_json_array(path)
+    
+    def sentence_spans(self, text):
+        """Posiciones (inicio, fin) de cada oración dentro del texto original"""
+        # No se corta tras abreviaturas de una letra ("m s. n. m."); las referencias [1] quedan en la oración
+        for match in re.finditer(r'\S.*?(?:(?<!\b\w)[.!?](?:\[\d+\]|\u200b)*(?=\s|$)|$)', text, re.S):
+            start, end = match.span()
+            # Las oraciones demasiado largas (listas) se parten en los espacios
+            while end - start > self.max_chars:
+                cut = text.rfind(' ', start, start + self.max_chars)
+                if cut <= start:
+                    cut = start + self.max_chars
+                yield start, cut
+                start = cut + 1
+            yield start, end
+    
+    def iter_passages(self, text):
+        """Pasajes (desplazamiento, texto) de hasta max_chars, solapados por oraciones"""
+        spans = list(self.sentence_spans(text))
+        i = 0
+        while i < len(spans):
+            j = i + 1
+            while j < len(spans) and spans[j][1] - spans[i][0] <= self.max_chars:
+                j += 1
+            
+            passage = re.sub(r'\[\d+\]|\u200b', '', text[spans[i][0]:spans[j - 1][1]])
+            passage = re.sub(r'\s+', ' ', passage).strip()
+            if len(passage) >= self.min_chars:
+                yield spans[i][0], passage
+            
+            if j >= len(spans):
+                break
+            i = max(i + 1, j - self.overlap)
+    
+    def iter_sentences(self):
+        """(pasaje, fuente) de todos los registros; las URLs repetidas entre archivos se omiten"""
+        seen_urls = set()
+        for path in self.paths:
+            if not os.path.exists(path):
+                continue
+            
+            count = 0
+            try:
+                for record in self.iter_records(path):
+                    url = record.get('url')
+                    if not url or url in seen_urls:
+                        continue
+                    seen_urls.add(url)
+                    for offset, passage in self.iter_passages(record.get('contenido') or ''):
+                        count += 1
+                        yield passage, SourceInfo(url, record.get('titulo'), offset)
+            except (OSError, ValueError, csv.Error) as e:
+                print(f"⚠️ Error leyendo {path}: {e}")
+            
+            print(f"✅ {os.path.basename(path)}: {count} pasajes")
+
+# Normalización compartida por el índice y las consultas (BM25, entidades, TF-IDF y el buffer plegado)
+WORD_PATTERN = re.compile(r'\w+')
+ACCENT_FOLD = str.maketrans('áéíóúüàèìòùâêîôû', 'aeiouuaeiouaeiou')  # Conserva la ñ
+
+class ParsedQuery:
+    """Consulta normalizada una sola vez y reutilizada por todo el camino de búsqueda
+    
+    words: palabras plegadas (sin tildes ni stopwords) más sinónimos, en orden y sin repetir
+    terms: raíces de las palabras de la consulta original
+    expanded: raíces de terms más las de los sinónimos
+    corrections: {palabra escrita: palabra del vocabulario} para los términos corregidos
+    weights: {raíz expandida: peso}; las correcciones y sus sinónimos pesan menos que lo escrito
+    ceiling: {raíz: peso} para el máximo teórico: terms, con cada término corregido
+        reemplazado por su corrección (con el peso de la corrección)
+    """
+    __slots__ = ('text', 'words', 'terms', 'expanded', 'corrections', 'weights', 'ceiling')
+    
+    def __init__(self, text, words=(), terms=(), expanded=(), corrections=None, weights=None, ceiling=None):
+        self.text = text
+        self.words = words
+        self.terms = terms
+        self.expanded = expanded
+        self.corrections = corrections or {}
+        self.weights = weights if weights is not None else dict.fromkeys(expanded, 1.0)
+        self.ceiling = ceiling if ceiling is not None else dict.fromkeys(terms, 1.0)
+    
+    @property
+    def phrase(self):
+        """Texto normalizado de la consulta expandida (para los n-gramas de TF-IDF)"""
+        return ' '.join(self.words)
+    
+    def __bool__(self):
+        return bool(self.terms)
+    
+    def __str__(self):
+        return ' '.join(self.expanded)
+
 class QueryProcessor:
+    # Peso de un término corregido ("jagur" -> "jaguar") frente a uno escrito tal cual
+    CORRECTION_WEIGHT = 0.5
+    
     def __init__(self):
-        self.stopwords = {
+        self.stopwords = frozenset({
             'que', 'de', 'la', 'el', 'en', 'y', 'a', 'los', 'del', 'se', 'las', 'por', 'un', 'para',
             'con', 'no', 'una', 'su', 'al', 'lo', 'como', 'mas', 'pero', 'sus', 'le', 'ya', 'o',
             'este', 'si', 'porque', 'esta', 'entre', 'cuando', 'muy', 'sin', 'sobre', 'tambien',
             'me', 'ha', 'todo', 'ser', 'son', 'dos', 'fue', 'habia', 'hay', 'puede', 'todos',
             'asi', 'nos', 'ni', 'parte', 'tiene', 'el', 'eso', 'etc', 'cual', 'cuales', 'como',
             'donde', 'cuando', 'por', 'que', 'quien', 'cuyo', 'cuyos'
-        }
+        })
         
         # Sinónimos y términos relacionados
         self.synonyms = {
@@ -135,58 +739,1415 @@ class QueryProcessor:
             'altiplano': ['altiplano', 'andino', 'puna'],
             'peligro': ['peligro', 'amenaza', 'extincion', 'amenazada']
         }
+        
+        # Categorías de palabras clave (solo para el modo 'legacy'; los demás usan el índice de entidades)
+        self.categories = {
+            'especies': ['jaguar', 'condor', 'oso', 'paraba', 'delfin', 'rana', 'armadillo'],
+            'regiones': ['amazonia', 'altiplano', 'yungas', 'chaco', 'andino', 'titicaca'],
+            'conceptos': ['peligro', 'extincion', 'conservacion', 'proteccion', 'habitat']
+        }
+        
+        self.stems = {}  # palabra plegada -> raíz (memoriza light_stem)
+        # Tabla compilada una vez: raíz -> sinónimos
+        self.expansions = {self.stem(word): tuple(words) for word, words in self.synonyms.items()}
+    
+    @staticmethod
+    def fold(text):
+        """Minúsculas sin tildes ("Cóndor" -> "condor")"""
+        return text.lower().translate(ACCENT_FOLD)
+    
+    @staticmethod
+    def light_stem(word):
+        """Stemmer ligero del español: quita la s del plural y después la vocal final de género
+        
+        Las dos reglas usan el mismo umbral, así que singular y plural comparten raíz:
+        rana/ranas -> ran, lago/lagos -> lag, jaguar/jaguares -> jaguar, oso/osos -> oso.
+        """
+        if len(word) > 3 and word.endswith('s'):
+            word = word[:-1]
+        if len(word) > 3 and word.endswith(('a', 'o', 'e')):
+            word = word[:-1]
+        return word
+    
+    def stem(self, word):
+        stemmed = self.stems.get(word)
+        if stemmed is None:
+            stemmed = self.stems[word] = self.light_stem(word)
+        return stemmed
     
-    def clean_query(self, query):
-        """Limpia y expande la consulta"""
+    def words(self, text):
+        """Palabras plegadas sin stopwords ni palabras de menos de 3 letras"""
+        stopwords = self.stopwords
+        return [word for word in WORD_PATTERN.findall(self.fold(text))
+                if len(word) > 2 and word not in stopwords]
+    
+    def tokenize(self, text):
+        """Normaliza un texto y devuelve sus raíces (misma regla para consultas y oraciones)"""
+        if not text:
+            return []
+        
+        stem = self.stem
+        return [stem(word) for word in self.words(text)]
+    
+    def extract_keywords(self, query):
+        """Palabras clave del modo 'legacy' con las reglas originales, sobre texto plegado y sin raíces
+        
+        'all' son las palabras de la consulta más sus sinónimos; cada categoría, las de 'all' de su lista.
+        """
+        words = {}
+        for word in self.words(query):
+            words[word] = None
+            for related in self.synonyms.get(word, ()):
+                words[related] = None
+        
+        keywords = {'all': list(words)}
+        for category, terms in self.categories.items():
+            keywords[category] = [word for word in words if word in terms]
+        return keywords
+    
+    def parse(self, query, correct=None):
+        """Normaliza y expande la consulta en una sola pasada
+        
+        correct(raíz), si se da, devuelve (raíz, palabra) del vocabulario más parecidas a
+        un término desconocido (o None): "jagur" se busca también como "jaguar", con
+        menor peso, y en el máximo teórico la corrección ocupa el lugar de lo escrito.
+        """
         if not query:
-            return ""
+            return ParsedQuery(query or "")
+        
+        # dict conserva el orden de inserción y descarta repetidos
+        words, terms, expanded, corrections, ceiling = {}, {}, {}, {}, {}
+        for word in self.words(query):
+            term = self.stem(word)
+            terms[term] = None
+            variants = [(word, term, 1.0)]
+            corrected = correct(term) if correct else None
+            if corrected:
+                corrected_term, corrected_word = corrected
+                corrections[word] = corrected_word
+                variants.append((self.fold(corrected_word), corrected_term, self.CORRECTION_WEIGHT))
+            # El término escrito desconocido no tiene documentos: su IDF inflaría el máximo
+            ceiling_term, ceiling_weight = variants[-1][1:]
+            ceiling[ceiling_term] = max(ceiling_weight, ceiling.get(ceiling_term, 0.0))
+            for variant, variant_term, weight in variants:
+                for related in (variant,) + self.expansions.get(variant_term, ()):
+                    related_term = self.stem(related)
+                    words[related] = None
+                    expanded[related_term] = max(weight, expanded.get(related_term, 0.0))
+        
+        return ParsedQuery(query, tuple(words), tuple(terms), tuple(expanded), corrections, expanded, ceiling)
+
+def document_key(sentence, source):
+    """Clave de un documento: hash de 64 bits de la URL (o archivo) de origen y del contenido (nunca 0)"""
+    url = source.url if source else ''
+    digest = hashlib.blake2b(f"{url}\n{sentence}".encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little') or 1
+
+class TfidfScorer:
+    """Matriz TF-IDF dispersa de n-gramas de caracteres, puntuada con NumPy
+    
+    La matriz se guarda por columnas (formato CSC: para cada n-grama, las oraciones
+    que lo contienen y su peso), así que una consulta es un único producto
+    matriz-vector disperso resuelto con np.bincount.
+    """
+    def __init__(self, ngram_range=(3, 4)):
+        if import_numpy() is None:
+            raise ImportError("El modo 'tfidf' requiere NumPy (pip install numpy)")
         
-        # Convertir a minúsculas y limpiar
-        query = query.lower().strip()
-        query = re.sub(r'[^\w\sáéíóúñ]', ' ', query)
-        query = re.sub(r'\s+', ' ', query)
+        self.ngram_range = ngram_range
+        self.vocabulary = {}  # n-grama -> columna
+        self.idf = np.zeros(0)
+        self.col_ptr = np.zeros(1, dtype=np.int64)
+        self.col_docs = np.zeros(0, dtype=np.int32)
+        self.col_weights = np.zeros(0)
+        self.n_docs = 0
+    
+    def ngrams(self, text):
+        """Cuenta los n-gramas de cada palabra (plegada como en el índice BM25, con bordes marcados)"""
+        counts = {}
+        low, high = self.ngram_range
+        for word in WORD_PATTERN.findall(QueryProcessor.fold(text)):
+            padded = f' {word} '
+            for n in range(low, high + 1):
+                for i in range(len(padded) - n + 1):
+                    gram = padded[i:i + n]
+                    counts[gram] = counts.get(gram, 0) + 1
+        return counts
+    
+    def build(self, sentences):
+        """Construye la matriz TF-IDF normalizada (L2) de todas las oraciones"""
+        doc_ids, features, tfs = [], [], []
+        for doc_id, sentence in enumerate(sentences):
+            for gram, count in self.ngrams(sentence).items():
+                feature = self.vocabulary.setdefault(gram, len(self.vocabulary))
+                doc_ids.append(doc_id)
+                features.append(feature)
+                tfs.append(count)
         
-        # Tokenizar y filtrar stopwords
-        words = [word for word in query.split() 
-                if word not in self.stopwords and len(word) > 2]
+        self.n_docs = len(sentences)
+        doc_ids = np.array(doc_ids, dtype=np.int32)
+        features = np.array(features, dtype=np.int64)
         
-        # Expandir con sinónimos
-        expanded_words = []
-        for word in words:
-            expanded_words.append(word)
-            if word in self.synonyms:
-                expanded_words.extend(self.synonyms[word])
+        # TF sublineal por IDF suavizado
+        df = np.bincount(features, minlength=len(self.vocabulary))
+        self.idf = np.log((1 + self.n_docs) / (1 + df)) + 1
+        weights = (1 + np.log(np.array(tfs, dtype=np.float64))) * self.idf[features]
+        norms = np.sqrt(np.bincount(doc_ids, weights=weights ** 2, minlength=self.n_docs))
+        weights /= np.maximum(norms[doc_ids], 1e-12)
         
-        return ' '.join(list(set(expanded_words)))  # Remover duplicados
+        # Ordenar por columna (CSC)
+        order = np.argsort(features, kind='stable')
+        self.col_docs = doc_ids[order]
+        self.col_weights = weights[order]
+        self.col_ptr = np.concatenate(([0], np.cumsum(df)))
     
-    def extract_keywords(self, query):
-        """Extrae palabras clave principales"""
-        clean_query = self.clean_query(query)
-        words = clean_query.split()
+    def query_vector(self, text):
+        """Vector disperso (columnas, pesos) de la consulta; ignora n-gramas fuera del vocabulario"""
+        columns, weights = [], []
+        for gram, count in self.ngrams(text).items():
+            column = self.vocabulary.get(gram)
+            if column is not None:
+                columns.append(column)
+                weights.append((1 + math.log(count)) * self.idf[column])
         
-        # Categorizar palabras
-        categories = {
-            'especies': ['jaguar', 'condor', 'oso', 'paraba', 'delfin', 'rana', 'armadillo'],
-            'regiones': ['amazonia', 'altiplano', 'yungas', 'chaco', 'andino', 'titicaca'],
-            'conceptos': ['peligro', 'extincion', 'conservacion', 'proteccion', 'habitat']
+        weights = np.array(weights, dtype=np.float64)
+        norm = np.sqrt(np.dot(weights, weights))
+        return np.array(columns, dtype=np.int64), weights / norm if norm else weights
+    
+    def search(self, text, k=5):
+        """Devuelve los k mejores (doc_id, similitud coseno) para una consulta"""
+        return self.search_batch([text], k)[0]
+    
+    def search_batch(self, texts, k=5):
+        """Puntúa un lote de consultas fila por fila, sin la matriz densa consultas × oraciones
+        
+        Cada fila solo acumula las oraciones que comparten algún n-grama con su consulta
+        y se reduce enseguida a sus k mejores, así que la memoria no crece con el lote.
+        """
+        if not self.n_docs:
+            return [[] for _ in texts]
+        
+        results = []
+        for text in texts:
+            docs, weights = [], []
+            columns, query_weights = self.query_vector(text)
+            for column, query_weight in zip(columns, query_weights):
+                start, end = self.col_ptr[column], self.col_ptr[column + 1]
+                docs.append(self.col_docs[start:end])
+                weights.append(self.col_weights[start:end] * query_weight)
+            results.append(self.top_k(docs, weights, k))
+        return results
+    
+    @staticmethod
+    def top_k(docs, weights, k):
+        """Fila dispersa de puntajes (trozos de doc_ids y pesos) reducida a sus k mejores (doc_id, puntaje)"""
+        if not docs:
+            return []
+        
+        # Producto q · Xᵀ restringido a las oraciones candidatas: se suman los pesos por doc_id
+        candidates, positions = np.unique(np.concatenate(docs), return_inverse=True)
+        scores = np.bincount(positions, weights=np.concatenate(weights))
+        k_eff = min(k, len(candidates))
+        top = np.argpartition(-scores, k_eff - 1)[:k_eff]
+        top = top[np.lexsort((candidates[top], -scores[top]))]
+        return [(int(candidates[i]), float(scores[i])) for i in top if scores[i] > 0]
+
+class InvertedIndex:
+    """Índice invertido con ranking BM25 sobre listas de postings"""
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = {}  # término -> {doc_id: frecuencia}
+        self.doc_lengths = []  # 0 en los documentos borrados
+        self.total_length = 0
+        self.avg_length = 0.0
+        self.deleted = 0
+        self.owned = None  # Tras copy(): términos cuyos postings ya no se comparten (None: todos propios)
+    
+    @property
+    def size(self):
+        """Documentos vivos"""
+        return len(self.doc_lengths) - self.deleted
+    
+    def build(self, tokenized_docs):
+        """Construye el índice a partir de documentos ya tokenizados"""
+        self.postings = {}
+        self.doc_lengths = []
+        self.total_length = 0
+        self.deleted = 0
+        self.owned = None
+        for tokens in tokenized_docs:
+            self.add(tokens)
+    
+    def copy(self):
+        """Copia que comparte los postings con el original hasta que se modifican (copy-on-write)"""
+        index = InvertedIndex(self.k1, self.b)
+        index.postings = dict(self.postings)
+        index.doc_lengths = list(self.doc_lengths)
+        index.total_length = self.total_length
+        index.avg_length = self.avg_length
+        index.deleted = self.deleted
+        index.owned = set()
+        return index
+    
+    def writable(self, term):
+        """Postings de un término que se pueden modificar sin afectar a otras copias"""
+        postings = self.postings.get(term)
+        if postings is None:
+            postings = self.postings[term] = {}
+        elif self.owned is not None and term not in self.owned:
+            postings = self.postings[term] = dict(postings)
+        else:
+            return postings
+        if self.owned is not None:
+            self.owned.add(term)
+        return postings
+    
+    def add(self, tokens):
+        """Agrega un documento al final del índice y devuelve su doc_id"""
+        doc_id = len(self.doc_lengths)
+        self.doc_lengths.append(len(tokens))
+        for token in tokens:
+            postings = self.writable(token)
+            postings[doc_id] = postings.get(doc_id, 0) + 1
+        
+        self.total_length += len(tokens)
+        self.update_average()
+        return doc_id
+    
+    def remove(self, doc_id, tokens):
+        """Borra un documento (con los mismos tokens con que se agregó); su doc_id queda libre"""
+        for token in set(tokens):
+            postings = self.writable(token)
+            postings.pop(doc_id, None)
+            if not postings:
+                del self.postings[token]
+        
+        self.total_length -= self.doc_lengths[doc_id]
+        self.doc_lengths[doc_id] = 0
+        self.deleted += 1
+        self.update_average()
+    
+    def update_average(self):
+        self.avg_length = self.total_length / self.size if self.size else 0.0
+    
+    def compacted(self, doc_map, live):
+        """Índice nuevo sin huecos: doc_map[viejo] -> nuevo, live = doc_ids viejos que sobreviven"""
+        index = InvertedIndex(self.k1, self.b)
+        index.postings = {term: {doc_map[doc_id]: tf for doc_id, tf in postings.items()}
+                          for term, postings in self.postings.items()}
+        index.doc_lengths = [self.doc_lengths[doc_id] for doc_id in live]
+        index.total_length = self.total_length
+        index.update_average()
+        return index
+    
+    def idf(self, term):
+        """IDF de BM25 (siempre positivo)"""
+        n = self.size
+        df = len(self.postings.get(term, ()))
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+    
+    def max_score(self, terms):
+        """Máximo teórico: cada término aparece una vez en una oración de longitud media
+        
+        terms puede ser una lista de raíces o un dict {raíz: peso}.
+        """
+        weights = terms if isinstance(terms, dict) else dict.fromkeys(terms, 1.0)
+        return sum(self.idf(term) * weight for term, weight in weights.items())
+    
+    def search(self, terms, k=5, candidates=None):
+        """Devuelve los k mejores (doc_id, puntaje) recorriendo solo los postings de la consulta
+        
+        terms puede ser una lista de raíces o un dict {raíz: peso}.
+        """
+        return self.search_batch([terms], k, [candidates])[0]
+    
+    def search_batch(self, queries, k=5, candidates=None):
+        """Puntúa varias consultas recorriendo una sola vez los postings de cada término
+        
+        candidates, si se da, tiene por cada consulta un conjunto de doc_ids al que
+        restringir el ranking (o None para no restringirla). Cada consulta es una lista
+        de raíces o un dict {raíz: peso}.
+        """
+        scores = [{} for _ in queries]
+        queries_by_term = {}
+        for query_id, terms in enumerate(queries):
+            weights = terms if isinstance(terms, dict) else dict.fromkeys(terms, 1.0)
+            for term, factor in weights.items():
+                queries_by_term.setdefault(term, []).append((query_id, factor))
+        
+        avg_length = self.avg_length or 1.0
+        for term, query_ids in queries_by_term.items():
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            
+            idf = self.idf(term)
+            for doc_id, tf in postings.items():
+                length_norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / avg_length)
+                weight = idf * tf * (self.k1 + 1) / (tf + length_norm)
+                for query_id, factor in query_ids:
+                    query_scores = scores[query_id]
+                    query_scores[doc_id] = query_scores.get(doc_id, 0.0) + weight * factor
+        
+        results = []
+        for query_id, query_scores in enumerate(scores):
+            allowed = candidates[query_id] if candidates else None
+            items = query_scores.items() if allowed is None else (
+                (doc_id, score) for doc_id, score in query_scores.items() if doc_id in allowed)
+            results.append(heapq.nlargest(k, items, key=lambda item: item[1]))
+        return results
+    
+    def explain(self, doc_id, terms):
+        """Aporte BM25 de cada término de la consulta a un documento (su suma es el puntaje)"""
+        avg_length = self.avg_length or 1.0
+        length_norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / avg_length)
+        contributions = {}
+        weights = terms if isinstance(terms, dict) else dict.fromkeys(terms, 1.0)
+        for term, factor in weights.items():
+            tf = self.postings.get(term, {}).get(doc_id)
+            if tf:
+                contributions[term] = self.idf(term) * tf * (self.k1 + 1) / (tf + length_norm) * factor
+        return contributions
+    
+    def to_dict(self):
+        """Serializa el índice (compactado) para guardarlo en un snapshot"""
+        return {
+            'k1': self.k1,
+            'b': self.b,
+            'doc_lengths': self.doc_lengths,
+            'postings': {term: list(postings.items()) for term, postings in self.postings.items()}
         }
+    
+    @classmethod
+    def from_dict(cls, data):
+        """Reconstruye el índice desde un snapshot sin volver a tokenizar"""
+        index = cls(k1=data['k1'], b=data['b'])
+        index.doc_lengths = data['doc_lengths']
+        index.postings = {term: dict(postings) for term, postings in data['postings'].items()}
+        index.total_length = sum(index.doc_lengths)
+        index.avg_length = index.total_length / len(index.doc_lengths) if index.doc_lengths else 0.0
+        return index
+
+def within_distance(a, b, distance):
+    """True si a y b están a lo sumo a `distance` ediciones (inserción, borrado, cambio o transposición)"""
+    # Lo común al principio y al final no cuesta nada: solo se explora la parte distinta
+    start, end_a, end_b = 0, len(a), len(b)
+    while start < end_a and start < end_b and a[start] == b[start]:
+        start += 1
+    while end_a > start and end_b > start and a[end_a - 1] == b[end_b - 1]:
+        end_a -= 1
+        end_b -= 1
+    a, b = a[start:end_a], b[start:end_b]
+    if not a or not b:
+        return len(a) + len(b) <= distance
+    if distance == 0 or abs(len(a) - len(b)) > distance:
+        return False
+    distance -= 1
+    return (within_distance(a[1:], b[1:], distance)
+            or within_distance(a[1:], b, distance)
+            or within_distance(a, b[1:], distance)
+            or (len(a) > 1 and len(b) > 1 and a[0] == b[1] and a[1] == b[0]
+                and within_distance(a[2:], b[2:], distance)))
+
+def edit_distance(a, b, max_distance):
+    """Distancia de edición (con transposiciones) acotada: max_distance + 1 si la supera"""
+    for distance in range(max_distance + 1):
+        if within_distance(a, b, distance):
+            return distance
+    return max_distance + 1
+
+class FuzzyTermIndex:
+    """Diccionario de borrados simétricos (SymSpell) sobre el vocabulario del índice
+    
+    Cada término se registra bajo todas las variantes que resultan de borrarle hasta
+    max_distance letras de sus primeros prefix_length caracteres; una consulta genera
+    sus propias variantes y solo compara con los términos que comparten alguna. Las
+    variantes se guardan como hash en un arreglo ordenado paralelo a los ids de
+    término (unos 12 bytes por variante) y se buscan por bisección; los choques de
+    hash solo agregan candidatos que luego descarta edit_distance. No se generan
+    variantes de menos de min_length letras: las de 1-2 letras las comparten miles
+    de términos y solo servirían para corregir palabras cortas, que no se corrigen.
+    """
+    def __init__(self, terms=(), max_distance=2, prefix_length=7, min_length=3):
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self.min_length = min_length
+        self.terms = []  # id -> término
+        self.ids = {}  # término -> id
+        self.hashes = array('q')  # hash de cada variante, ordenado
+        self.term_ids = array('l')  # id del término de cada variante
+        self.pending = {}  # Variantes agregadas después de build(): hash -> [id]
+        self.build(terms)
+    
+    def __len__(self):
+        return len(self.terms)
+    
+    @property
+    def nbytes(self):
+        """Memoria de los arreglos de variantes (sin contar las cadenas del vocabulario)"""
+        return self.hashes.itemsize * len(self.hashes) + self.term_ids.itemsize * len(self.term_ids)
+    
+    def variants(self, word, max_distance):
+        """La palabra y todas las que resultan de borrarle hasta max_distance letras"""
+        found = {word}
+        frontier = [word]
+        for _ in range(max_distance):
+            following = []
+            for current in frontier:
+                if len(current) <= self.min_length:
+                    continue
+                for i in range(len(current)):
+                    variant = current[:i] + current[i + 1:]
+                    if variant not in found:
+                        found.add(variant)
+                        following.append(variant)
+            frontier = following
+        return found
+    
+    def build(self, terms):
+        """Indexa un vocabulario completo de una vez (ordenando con NumPy si está disponible)"""
+        hashes, term_ids = array('q'), array('l')
+        for term in terms:
+            if term in self.ids:
+                continue
+            term_id = self.ids[term] = len(self.terms)
+            self.terms.append(term)
+            for variant in self.variants(term[:self.prefix_length], self.max_distance):
+                hashes.append(hash(variant))
+                term_ids.append(term_id)
+        hashes.extend(self.hashes)
+        term_ids.extend(self.term_ids)
         
-        keywords = {'all': words}
-        for category, terms in categories.items():
-            keywords[category] = [word for word in words if word in terms]
+        if import_numpy() is not None:
+            order = np.argsort(np.frombuffer(hashes, dtype=np.int64), kind='stable')
+            self.hashes = array('q', np.frombuffer(hashes, dtype=np.int64)[order].tobytes())
+            self.term_ids = array('l', np.frombuffer(term_ids, dtype=np.dtype('l'))[order].tobytes())
+        else:
+            order = sorted(range(len(hashes)), key=hashes.__getitem__)
+            self.hashes = array('q', (hashes[i] for i in order))
+            self.term_ids = array('l', (term_ids[i] for i in order))
+        self.pending = {}
+    
+    def add(self, term):
+        """Agrega un término nuevo sin reordenar los arreglos (para recargas incrementales)"""
+        if term in self.ids:
+            return
+        term_id = self.ids[term] = len(self.terms)
+        self.terms.append(term)
+        for variant in self.variants(term[:self.prefix_length], self.max_distance):
+            self.pending.setdefault(hash(variant), []).append(term_id)
+    
+    def lookup(self, word, max_distance=None):
+        """[(término, distancia)] a max_distance o menos, de menor a mayor distancia"""
+        max_distance = self.max_distance if max_distance is None else min(max_distance, self.max_distance)
+        hashes, term_ids, pending = self.hashes, self.term_ids, self.pending
+        candidates = set()
+        for variant in self.variants(word[:self.prefix_length], max_distance):
+            key = hash(variant)
+            position = bisect.bisect_left(hashes, key)
+            while position < len(hashes) and hashes[position] == key:
+                candidates.add(term_ids[position])
+                position += 1
+            candidates.update(pending.get(key, ()))
         
-        return keywords
+        matches = []
+        for term_id in candidates:
+            term = self.terms[term_id]
+            # La mayoría de los candidatos se descarta con una sola prueba acotada
+            if within_distance(word, term, max_distance):
+                matches.append((term, edit_distance(word, term, max_distance)))
+        matches.sort(key=lambda match: match[1])
+        return matches
 
-class SearchEngine:
+# Nombres científicos (binomios) que ocupan todo un paréntesis o una lista: "Jaguar (Panthera onca)"
+PARENTHESES = re.compile(r'\(([^()]{5,120})\)')
+NAME_SEPARATOR = re.compile(r'\s*(?:[,;]|\by\b)\s*')
+SCIENTIFIC_NAME = re.compile(r'[A-Z][a-z]{2,} [a-z]{3,}')
+
+class EntityIndex:
+    """Índice de entidades (especies, regiones y estados de conservación) -> doc_ids que las mencionan
+    
+    Los alias se comparan como secuencias de raíces (misma tokenización que el
+    índice BM25), así que "osos andinos" también cuenta como "oso andino". Al
+    indexar, un binomio entre paréntesis desconocido se agrega como alias de la
+    especie nombrada justo antes o, si no hay ninguna, como especie nueva.
+    """
+    def __init__(self, tokenize, gazetteer=None):
+        self.tokenize = tokenize
+        self.aliases = {}  # primera raíz -> [(raíces del alias, entidad)]; entidad = (categoría, nombre)
+        self.postings = {}  # entidad -> set(doc_id)
+        self.discovered = []  # (categoría, nombre, alias) descubiertos en el texto
+        self.owned = None  # Igual que en InvertedIndex: entidades cuyos postings ya no se comparten
+        for category, entities in (ENTITY_GAZETTEER if gazetteer is None else gazetteer).items():
+            for name, aliases in entities.items():
+                for alias in aliases:
+                    self.add_alias((category, name), alias)
+    
+    def add_alias(self, entity, alias):
+        terms = tuple(self.tokenize(alias))
+        if not terms:
+            return
+        entries = self.aliases.get(terms[0], [])
+        if (terms, entity) not in entries:
+            # Lista nueva en lugar de append: las copias comparten las listas anteriores
+            self.aliases[terms[0]] = entries + [(terms, entity)]
+    
+    def copy(self):
+        """Copia que comparte postings y alias con el original hasta que se modifican"""
+        entities = EntityIndex(self.tokenize, {})
+        entities.aliases = dict(self.aliases)
+        entities.postings = dict(self.postings)
+        entities.discovered = list(self.discovered)
+        entities.owned = set()
+        return entities
+    
+    def writable(self, entity):
+        """Postings de una entidad que se pueden modificar sin afectar a otras copias"""
+        postings = self.postings.get(entity)
+        if postings is None:
+            postings = self.postings[entity] = set()
+        elif self.owned is not None and entity not in self.owned:
+            postings = self.postings[entity] = set(postings)
+        else:
+            return postings
+        if self.owned is not None:
+            self.owned.add(entity)
+        return postings
+    
+    def entities_in(self, tokens):
+        """Entidades cuyos alias aparecen como secuencia contigua en los tokens de una oración"""
+        found = set()
+        for position, token in enumerate(tokens):
+            for terms, entity in self.aliases.get(token, ()):
+                if tuple(tokens[position:position + len(terms)]) == terms:
+                    found.add(entity)
+        return found
+    
+    def discover(self, sentence):
+        """Registra los nombres científicos entre paréntesis que todavía no son alias"""
+        for match in PARENTHESES.finditer(sentence):
+            names = NAME_SEPARATOR.split(match.group(1).strip())
+            if not all(SCIENTIFIC_NAME.fullmatch(name) for name in names):
+                continue
+            preceding = self.tokenize(sentence[max(0, match.start() - 60):match.start()])
+            for name in names:
+                terms = tuple(self.tokenize(name))
+                if not terms or any(alias == terms for alias, _ in self.aliases.get(terms[0], ())):
+                    continue
+                entity = self.entity_before(preceding) or ('especies', name)
+                self.add_alias(entity, name)
+                self.discovered.append(entity + (name,))
+    
+    def entity_before(self, tokens):
+        """Especie cuyo alias termina justo al final de los tokens ("... oso de anteojos")"""
+        for start in range(len(tokens)):
+            for terms, entity in self.aliases.get(tokens[start], ()):
+                if entity[0] == 'especies' and tuple(tokens[start:]) == terms:
+                    return entity
+        return None
+    
+    def add(self, doc_id, tokens, sentence):
+        """Indexa las entidades de un documento (tokens de InvertedIndex.add)"""
+        if '(' in sentence:
+            self.discover(sentence)
+        for entity in self.entities_in(tokens):
+            self.writable(entity).add(doc_id)
+    
+    def remove(self, doc_id, tokens):
+        """Quita un documento de los postings de sus entidades"""
+        for entity in self.entities_in(tokens):
+            postings = self.writable(entity)
+            postings.discard(doc_id)
+            if not postings:
+                del self.postings[entity]
+    
+    def compacted(self, doc_map):
+        """Índice sin huecos con los doc_ids renumerados según doc_map[viejo] -> nuevo"""
+        entities = self.copy()
+        entities.postings = {entity: {doc_map[doc_id] for doc_id in postings}
+                             for entity, postings in self.postings.items()}
+        entities.owned = None
+        return entities
+    
+    def match(self, terms):
+        """Entidades de una consulta por categoría: {categoría: [entidad]}
+        
+        Se usan las raíces originales (no los sinónimos) y su orden no importa; dentro
+        de una categoría gana el alias más específico: "peligro crítico" no arrastra
+        a "en peligro".
+        """
+        term_set = set(terms)
+        matches = []
+        for term in dict.fromkeys(terms):
+            for alias, entity in self.aliases.get(term, ()):
+                if term_set.issuperset(alias):
+                    matches.append((frozenset(alias), entity))
+        
+        facets = {}
+        for alias, entity in matches:
+            if any(entity[0] == other[0] and entity != other and alias < other_alias
+                   for other_alias, other in matches):
+                continue
+            found = facets.setdefault(entity[0], [])
+            if entity not in found:
+                found.append(entity)
+        return facets
+    
+    def documents(self, facets):
+        """doc_ids que cumplen todas las categorías (unión dentro de cada una, intersección entre ellas)"""
+        groups = [set().union(*(self.postings.get(entity, ()) for entity in entities))
+                  for entities in facets.values()]
+        if not groups:
+            return set()
+        groups.sort(key=len)
+        return groups[0].intersection(*groups[1:])
+    
+    def mentions(self, doc_id, entities):
+        """True si el documento menciona alguna de las entidades"""
+        return any(doc_id in self.postings.get(entity, ()) for entity in entities)
+    
+    def top(self, category, k=3, within=None):
+        """Nombres de las k entidades de una categoría con más documentos (opcionalmente dentro de un conjunto)"""
+        counts = []
+        for entity, postings in self.postings.items():
+            if entity[0] == category:
+                count = len(postings) if within is None else len(postings & within)
+                if count:
+                    counts.append((count, entity[1]))
+        return [name for _, name in heapq.nlargest(k, counts)]
+    
+    def to_dict(self):
+        """Serializa los alias descubiertos y los postings (compactados) para el snapshot"""
+        return {
+            'discovered': self.discovered,
+            'postings': [[category, name, sorted(postings)]
+                         for (category, name), postings in self.postings.items()]
+        }
+    
+    @classmethod
+    def from_dict(cls, tokenize, data):
+        """Reconstruye el índice desde un snapshot sin volver a leer las oraciones"""
+        entities = cls(tokenize)
+        for category, name, alias in data['discovered']:
+            entities.add_alias((category, name), alias)
+            entities.discovered.append((category, name, alias))
+        entities.postings = {(category, name): set(postings) for category, name, postings in data['postings']}
+        return entities
+
+class KnowledgeSnapshot:
+    """Snapshot versionado en disco: metadatos, fuentes e índice en JSON y las oraciones en un SentenceStore"""
+    def __init__(self, path=SNAPSHOT_PATH, max_age=SNAPSHOT_MAX_AGE, use_mmap=False):
+        self.path = path
+        self.store_path = os.path.splitext(path)[0] + '.store'
+        self.max_age = max_age
+        # Con use_mmap las oraciones se leen del disco bajo demanda (en Windows impide reemplazar el archivo)
+        self.use_mmap = use_mmap
+    
+    def load(self, files=None, allow_stale=False):
+        """Devuelve el contenido del snapshot, o None si falta, es de otra versión o está desactualizado
+        
+        Con allow_stale un snapshot desactualizado (fuentes, archivos o antigüedad) también
+        se devuelve, marcado con data['stale'], para responder mientras se sincroniza.
+        """
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        
+        metadata = data.get('metadata', {})
+        if metadata.get('version') != SNAPSHOT_VERSION or 'index' not in data or 'entities' not in data:
+            return None
+        stale = (metadata.get('sources') != SCRAPING_URLS or metadata.get('files', {}) != (files or {})
+                 or time.time() - metadata.get('created_at', 0) > self.max_age)
+        if stale and not allow_stale:
+            return None
+        
+        sources = [SourceInfo.from_list(source) for source in data['sources']]
+        try:
+            data['store'] = SentenceStore.open(self.store_path, sources, self.use_mmap)
+        except (OSError, ValueError, struct.error):
+            return None
+        # Las claves atan el almacén al JSON: un reemplazo a medias se detecta y se reconstruye
+        if zlib.crc32(data['store'].keys) != metadata.get('keys_crc'):
+            return None
+        data['stale'] = stale
+        return data
+    
+    def save(self, store, index, entities, files=None):
+        """Escribe el snapshot de forma atómica (archivos temporales + reemplazo); store no debe tener huecos"""
+        data = {
+            'metadata': {
+                'version': SNAPSHOT_VERSION,
+                'created_date': datetime.now().isoformat(),
+                'created_at': time.time(),
+                'sources': SCRAPING_URLS,
+                'files': files or {},
+                'total_sentences': len(store),
+                'keys_crc': zlib.crc32(store.keys)
+            },
+            'sources': [source.to_list() if source else None for source in store.sources],
+            'index': index.to_dict(),
+            'entities': entities.to_dict()
+        }
+        
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        store.save(self.store_path + '.tmp')
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(self.store_path + '.tmp', self.store_path)
+        os.replace(tmp_path, self.path)
+
+class NearDuplicateFilter:
+    """Detección de casi-duplicados con MinHash y LSH por bandas
+    
+    Cada oración se resume en una firma MinHash de sus raíces; la firma se divide
+    en bandas y solo las oraciones que comparten alguna banda se comparan con la
+    similitud de Jaccard exacta. Cada oración cuesta O(firma + candidatas), así que
+    la construcción sigue siendo aproximadamente lineal.
+    """
+    PRIME = (1 << 31) - 1  # a·h + b cabe en 64 bits, también con NumPy
+    
+    # 10 bandas de 6 filas: pares con similitud 0.8 son candidatos con p ≈ 0.95, con 0.4 solo p ≈ 0.04
+    def __init__(self, tokenize, threshold=0.8, num_perm=60, bands=10, seed=1):
+        if num_perm % bands:
+            raise ValueError("num_perm debe ser múltiplo de bands")
+        
+        self.tokenize = tokenize
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        rng = random.Random(seed)
+        self.permutations = [(rng.randrange(1, self.PRIME), rng.randrange(self.PRIME)) for _ in range(num_perm)]
+        self.coefficients = None  # Con NumPy, en la primera firma
+        self.reset()
+    
+    def signature(self, shingles):
+        """Firma MinHash: el mínimo de cada permutación (a·h + b) mod p"""
+        prime = self.PRIME
+        # crc32 es estable entre procesos (hash() de str cambia con cada arranque)
+        hashes = [zlib.crc32(shingle.encode('utf-8')) & prime for shingle in shingles]
+        if self.coefficients is None and import_numpy() is not None:
+            self.coefficients = np.array(self.permutations, dtype=np.uint64).T.reshape(2, -1, 1)
+        if self.coefficients is not None:
+            a, b = self.coefficients
+            return ((a * np.array(hashes, dtype=np.uint64) + b) % prime).min(axis=1).tolist()
+        return [min((a * h + b) % prime for h in hashes) for a, b in self.permutations]
+    
+    def band_keys(self, signature):
+        rows = self.rows
+        return [(band, tuple(signature[band * rows:(band + 1) * rows])) for band in range(self.bands)]
+    
+    @staticmethod
+    def source_rank(source):
+        """Preferencia de fuentes: página web con título > página web > archivo > sin fuente"""
+        if source is None:
+            return 0
+        if source.url.startswith('http'):
+            return 3 if source.title else 2
+        return 1
+    
+    def quality(self, sentence, source):
+        """Criterio para elegir la copia que representa a un grupo (a igual fuente, la más completa)"""
+        return self.source_rank(source), len(sentence)
+    
+    def reset(self):
+        self.buckets = {}  # (banda, valores) -> claves de los representantes
+        self.members = {}  # clave del representante -> (raíces, calidad, bandas)
+        self.suppressed = {}  # clave descartada -> clave del representante que la cubre
+        self.removed = 0
+    
+    def seed(self, sentences):
+        """Registra (clave, oración, fuente) ya deduplicadas como representantes, sin compararlas"""
+        self.reset()
+        for key, sentence, source in sentences:
+            shingles = frozenset(self.tokenize(sentence))
+            if shingles:
+                self.insert(key, shingles, self.quality(sentence, source))
+    
+    def offer(self, key, sentence, source, tokens=None):
+        """Clasifica un documento: ('new', None), ('duplicate', representante) o ('replace', representante)
+        
+        tokens, si se dan, son las raíces ya calculadas de la oración (se evita tokenizarla otra vez).
+        """
+        shingles = frozenset(self.tokenize(sentence) if tokens is None else tokens)
+        if not shingles:
+            return 'new', None
+        
+        quality = self.quality(sentence, source)
+        keys = self.band_keys(self.signature(shingles))
+        match = self.find_match(shingles, keys)
+        if match is None:
+            self.insert(key, shingles, quality, keys)
+            return 'new', None
+        
+        self.removed += 1
+        if quality > self.members[match][1]:
+            self.discard(match)
+            self.insert(key, shingles, quality, keys)
+            self.suppressed[match] = key
+            return 'replace', match
+        self.suppressed[key] = match
+        return 'duplicate', match
+    
+    def insert(self, key, shingles, quality, keys=None):
+        if keys is None:
+            keys = self.band_keys(self.signature(shingles))
+        self.members[key] = (shingles, quality, keys)
+        for band_key in keys:
+            self.buckets.setdefault(band_key, []).append(key)
+    
+    def discard(self, key):
+        """Quita un representante (por ejemplo, porque su documento se borró)"""
+        member = self.members.pop(key, None)
+        if member is None:
+            return
+        for band_key in member[2]:
+            bucket = self.buckets[band_key]
+            bucket.remove(key)
+            if not bucket:
+                del self.buckets[band_key]
+    
+    def covered(self, key, live):
+        """True si la clave se descartó y su representante sigue entre las claves vivas"""
+        return self.suppressed.get(key) in live
+    
+    def find_match(self, shingles, keys):
+        """Primer representante cuya similitud de Jaccard alcanza el umbral, o None"""
+        checked = set()
+        for band_key in keys:
+            for key in self.buckets.get(band_key, ()):
+                if key in checked:
+                    continue
+                checked.add(key)
+                other = self.members[key][0]
+                if len(shingles & other) >= self.threshold * len(shingles | other):
+                    return key
+        return None
+
+class QueryCache:
+    """Caché LRU con expiración (TTL) de rankings, con contadores de aciertos y fallos"""
+    def __init__(self, max_size=1024, ttl=600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()  # clave -> (instante de inserción, valor)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.generation = 0  # Aumenta con cada clear(): un put de una generación anterior se descarta
+    
+    def get(self, key):
+        """Devuelve el valor guardado o None si no existe o expiró"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                if entry is not None:
+                    del self.entries[key]
+                self.misses += 1
+                return None
+            
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+    
+    def put(self, key, value, generation=None):
+        """Guarda un valor y descarta el menos usado si se supera max_size
+        
+        Con generation (leída antes de calcular el valor) no se guarda nada si entretanto
+        hubo un clear(): el valor corresponde a una base ya reemplazada.
+        """
+        with self.lock:
+            if generation is not None and generation != self.generation:
+                return
+            self.entries[key] = (time.monotonic(), value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+    
+    def clear(self):
+        """Invalida todas las entradas (se llama al publicar una base nueva)"""
+        with self.lock:
+            self.entries.clear()
+            self.generation += 1
+    
+    def stats(self):
+        """Contadores de uso de la caché"""
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self.entries),
+                'hit_rate': self.hits / total if total else 0.0
+            }
+
+class SearchMetrics:
+    """Latencia por etapa de las búsquedas, acumulada de forma segura entre hilos
+    
+    Etapas: normalize (análisis de la consulta), retrieve (caché y recorrido del índice,
+    que en BM25 también suma los puntajes), score (desglose por señal y confianza) y
+    fallback (respuesta alternativa). Si se indica un hook, recibe cada registro como dict.
+    """
+    STAGES = ('normalize', 'retrieve', 'score', 'fallback')
+    
+    def __init__(self, hook=None, window=1000):
+        self.hook = hook
+        self.lock = threading.Lock()
+        self.totals = dict.fromkeys(self.STAGES, 0.0)
+        self.latencies = deque(maxlen=window)  # Últimos totales por consulta (ms), para percentiles
+        self.count = 0
+    
+    def record(self, record):
+        """Acumula un registro {'stages': {etapa: ms}, 'queries': n, ...} y lo entrega al hook"""
+        queries = record.setdefault('queries', 1)
+        record['total_ms'] = sum(record['stages'].values())
+        with self.lock:
+            self.count += queries
+            for stage, elapsed in record['stages'].items():
+                self.totals[stage] += elapsed
+            self.latencies.append(record['total_ms'] / queries)
+        if self.hook:
+            self.hook(record)
+    
+    def clear(self):
+        with self.lock:
+            self.totals = dict.fromkeys(self.STAGES, 0.0)
+            self.latencies.clear()
+            self.count = 0
+    
+    def stats(self):
+        """Promedio por etapa y percentiles de la latencia total (ms)"""
+        with self.lock:
+            count = self.count
+            totals = dict(self.totals)
+            latencies = sorted(self.latencies)
+        
+        def percentile(fraction):
+            return latencies[int(fraction * (len(latencies) - 1))] if latencies else 0.0
+        
+        return {
+            'searches': count,
+            'mean_ms': {stage: total / count if count else 0.0 for stage, total in totals.items()},
+            'p50_ms': percentile(0.50),
+            'p95_ms': percentile(0.95)
+        }
+
+class SentenceStore:
+    """Oraciones en un único buffer UTF-8 con arreglos paralelos de desplazamientos, claves y fuentes
+    
+    text guarda las oraciones una tras otra y folded sus formas en minúsculas y sin
+    tildes, separadas por '\n' para que una subcadena nunca cruce dos oraciones. Un
+    doc_id es la posición en offsets/folded_offsets/keys/sources; la clave 0 marca un
+    hueco (documento borrado). open(..., use_mmap=True) mapea el archivo en memoria en
+    lugar de leerlo: las oraciones se decodifican solo cuando se piden.
+    """
+    MAGIC = b'ECOSTORE'
+    HEADER = struct.Struct('<8s8sQQQ')  # magic, orden de bytes, documentos, bytes de text, bytes de folded
+    
     def __init__(self):
+        self.buffer = None  # mmap del archivo, si lo hay
+        self.text = bytearray()
+        self.text_base = 0  # Posición de text/folded dentro de self.buffer cuando está mapeado
+        self.folded = bytearray()
+        self.folded_base = 0
+        self.offsets = array('Q', [0])
+        self.folded_offsets = array('Q', [0])
+        self.keys = array('Q')  # document_key de cada doc_id (0 = hueco)
+        self.sources = []  # SourceInfo (con __slots__) o None
+        self.deleted = 0
+        self.positions = None  # clave -> doc_id, construido al primer uso
+    
+    def __len__(self):
+        """Posiciones ocupadas, incluidos los huecos"""
+        return len(self.keys)
+    
+    @property
+    def live(self):
+        """Oraciones vivas"""
+        return len(self.keys) - self.deleted
+    
+    @property
+    def nbytes(self):
+        """Memoria de los buffers y arreglos (sin contar las fuentes)"""
+        return self.offsets[-1] + self.folded_offsets[-1] + 8 * (2 * len(self.offsets) + len(self.keys))
+    
+    @property
+    def doc_ids(self):
+        """Diccionario clave -> doc_id de los documentos vivos"""
+        if self.positions is None:
+            self.positions = {key: doc_id for doc_id, key in enumerate(self.keys) if key}
+        return self.positions
+    
+    def __getitem__(self, doc_id):
+        """Oración de un doc_id, o None si es un hueco"""
+        if not self.keys[doc_id]:
+            return None
+        start = self.text_base + self.offsets[doc_id]
+        return self.text[start:self.text_base + self.offsets[doc_id + 1]].decode('utf-8')
+    
+    def __iter__(self):
+        for doc_id in range(len(self.keys)):
+            yield self[doc_id]
+    
+    def folded_at(self, doc_id):
+        """Forma plegada (minúsculas, sin tildes) de un doc_id; '' en los huecos"""
+        if not self.keys[doc_id]:
+            return ''
+        start = self.folded_base + self.folded_offsets[doc_id]
+        return self.folded[start:self.folded_base + self.folded_offsets[doc_id + 1] - 1].decode('utf-8')
+    
+    def find_docs(self, needle):
+        """doc_id vivos cuya forma plegada contiene `needle`, buscando en el buffer completo"""
+        pattern = needle.encode('utf-8')
+        base, end = self.folded_base, self.folded_base + self.folded_offsets[-1]
+        offsets, keys = self.folded_offsets, self.keys
+        found = set()
+        position = self.folded.find(pattern, base, end)
+        while position >= 0:
+            doc_id = bisect.bisect_right(offsets, position - base) - 1
+            if keys[doc_id]:
+                found.add(doc_id)
+            # Basta una aparición por oración: se sigue desde la siguiente
+            position = self.folded.find(pattern, base + offsets[doc_id + 1], end)
+        return found
+    
+    def append(self, key, sentence, source, folded):
+        """Agrega una oración con su clave, fuente y forma plegada; devuelve su doc_id"""
+        self.writable()
+        doc_id = len(self.keys)
+        self.text += sentence.encode('utf-8')
+        self.offsets.append(len(self.text))
+        self.folded += folded.encode('utf-8') + b'\n'
+        self.folded_offsets.append(len(self.folded))
+        self.keys.append(key)
+        self.sources.append(source)
+        if self.positions is not None:
+            self.positions[key] = doc_id
+        return doc_id
+    
+    def remove(self, doc_id):
+        """Convierte un doc_id en hueco; los bytes quedan hasta compacted()"""
+        self.writable()
+        if self.positions is not None:
+            self.positions.pop(self.keys[doc_id], None)
+        self.keys[doc_id] = 0
+        self.sources[doc_id] = None
+        self.deleted += 1
+    
+    def writable(self):
+        """Pasa un almacén mapeado a memoria propia antes de modificarlo"""
+        if self.buffer is None:
+            return
+        self.text = bytearray(self.text[self.text_base:self.text_base + self.offsets[-1]])
+        self.folded = bytearray(self.folded[self.folded_base:self.folded_base + self.folded_offsets[-1]])
+        self.text_base = self.folded_base = 0
+        self.offsets = array('Q', self.offsets)
+        self.folded_offsets = array('Q', self.folded_offsets)
+        self.keys = array('Q', self.keys)
+        self.buffer = None
+    
+    def copy(self):
+        """Copia modificable que no afecta a las búsquedas sobre el original"""
+        store = SentenceStore()
+        store.text = bytearray(self.text[self.text_base:self.text_base + self.offsets[-1]])
+        store.folded = bytearray(self.folded[self.folded_base:self.folded_base + self.folded_offsets[-1]])
+        store.offsets = array('Q', self.offsets)
+        store.folded_offsets = array('Q', self.folded_offsets)
+        store.keys = array('Q', self.keys)
+        store.sources = list(self.sources)
+        store.deleted = self.deleted
+        return store
+    
+    def compacted(self):
+        """Almacén sin huecos con los documentos vivos en el mismo orden (copia bytes, no re-decodifica)"""
+        store = SentenceStore()
+        for doc_id, key in enumerate(self.keys):
+            if not key:
+                continue
+            store.text += self.text[self.text_base + self.offsets[doc_id]:self.text_base + self.offsets[doc_id + 1]]
+            store.offsets.append(len(store.text))
+            store.folded += self.folded[self.folded_base + self.folded_offsets[doc_id]:
+                                        self.folded_base + self.folded_offsets[doc_id + 1]]
+            store.folded_offsets.append(len(store.folded))
+            store.keys.append(key)
+            store.sources.append(self.sources[doc_id])
+        return store
+    
+    def save(self, path):
+        """Escribe los buffers y arreglos en un archivo binario (mapeable con open)"""
+        store = self.compacted() if self.deleted else self
+        text = store.text[store.text_base:store.text_base + store.offsets[-1]]
+        folded = store.folded[store.folded_base:store.folded_base + store.folded_offsets[-1]]
+        with open(path, 'wb') as f:
+            f.write(self.HEADER.pack(self.MAGIC, sys.byteorder.encode('ascii'), len(store.keys),
+                                     len(text), len(folded)))
+            f.write(array('Q', store.offsets).tobytes())
+            f.write(array('Q', store.folded_offsets).tobytes())
+            f.write(array('Q', store.keys).tobytes())
+            f.write(text)
+            f.write(folded)
+    
+    @classmethod
+    def open(cls, path, sources=None, use_mmap=False):
+        """Carga un almacén guardado con save(); con use_mmap los datos se leen del disco bajo demanda"""
+        with open(path, 'rb') as f:
+            if use_mmap:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                buffer = f.read()
+        
+        magic, byteorder, count, text_size, folded_size = cls.HEADER.unpack_from(buffer)
+        if magic != cls.MAGIC or byteorder.rstrip(b'\0') != sys.byteorder.encode('ascii'):
+            raise ValueError(f"Formato de almacén no reconocido: {path}")
+        
+        store = cls()
+        view = memoryview(buffer)
+        position = cls.HEADER.size
+        arrays = []
+        for size in (count + 1, count + 1, count):
+            arrays.append(view[position:position + 8 * size])
+            position += 8 * size
+        if position + text_size + folded_size != len(buffer):
+            raise ValueError(f"Almacén incompleto: {path}")
+        
+        if use_mmap:
+            # Los arreglos son vistas de solo lectura sobre el mapa; writable() los copia si hace falta
+            store.buffer = buffer
+            store.offsets, store.folded_offsets, store.keys = (values.cast('Q') for values in arrays)
+            store.text = store.folded = buffer
+            store.text_base, store.folded_base = position, position + text_size
+        else:
+            store.offsets, store.folded_offsets, store.keys = array('Q'), array('Q'), array('Q')
+            for target, values in zip((store.offsets, store.folded_offsets, store.keys), arrays):
+                target.frombytes(values)
+            store.text = bytearray(view[position:position + text_size])
+            store.folded = bytearray(view[position + text_size:])
+        store.sources = list(sources) if sources is not None else [None] * count
+        store.deleted = sum(1 for key in store.keys if not key)
+        return store
+
+class SearchState:
+    """Una generación de la base: el almacén de oraciones más las estructuras construidas sobre él
+    
+    Una generación publicada no se modifica. Las altas y bajas se aplican sobre
+    copy(), que comparte con ella los postings que no cambian; las bajas dejan
+    huecos hasta que compacted() fusiona los documentos vivos.
+    """
+    def __init__(self, store=None, index=None, tfidf=None, entities=None):
+        self.store = store if store is not None else SentenceStore()
+        self.index = index if index is not None else InvertedIndex()
+        self.tfidf = tfidf  # Solo en modo 'tfidf'
+        self.entities = entities  # EntityIndex construido con el mismo tokenizador que el índice
+        # FuzzyTermIndex del vocabulario; las copias lo comparten (solo crece: un término
+        # borrado sigue ahí pero se filtra contra los postings)
+        self.speller = None
+    
+    def __len__(self):
+        """Oraciones vivas"""
+        return self.store.live
+    
+    @property
+    def doc_ids(self):
+        return self.store.doc_ids
+    
+    @property
+    def deleted(self):
+        return self.store.deleted
+    
+    def copy(self):
+        """Generación siguiente, lista para modificarse sin afectar a las búsquedas en curso"""
+        state = SearchState(self.store.copy(), self.index.copy(), None, self.entities.copy())
+        state.speller = self.speller
+        return state
+    
+    def add(self, key, sentence, source, tokens, folded):
+        """Agrega un documento al final y devuelve su doc_id"""
+        if self.speller is not None:
+            for token in tokens:
+                self.speller.add(token)
+        doc_id = self.index.add(tokens)
+        self.store.append(key, sentence, source, folded)
+        self.entities.add(doc_id, tokens, sentence)
+        return doc_id
+    
+    def remove(self, doc_id, tokens):
+        """Borra un documento dejando un hueco en su doc_id"""
+        self.index.remove(doc_id, tokens)
+        self.store.remove(doc_id)
+        self.entities.remove(doc_id, tokens)
+    
+    def compacted(self):
+        """Fusiona los documentos vivos en una generación sin huecos (renumera los doc_id)"""
+        live = [doc_id for doc_id, key in enumerate(self.store.keys) if key]
+        doc_map = {doc_id: position for position, doc_id in enumerate(live)}
+        state = SearchState(self.store.compacted(), self.index.compacted(doc_map, live), None,
+                            self.entities.compacted(doc_map))
+        state.speller = self.speller
+        return state
+
+class SearchHit:
+    """Un resultado del ranking con su puntaje desglosado por señal"""
+    __slots__ = ('doc_id', 'sentence', 'source', 'score', 'components')
+    
+    def __init__(self, doc_id, sentence, source, score, components):
+        self.doc_id = doc_id
+        self.sentence = sentence
+        self.source = source
+        self.score = score
+        self.components = components
+    
+    def to_dict(self):
+        """Resultado serializable con su origen"""
+        return {
+            'sentence': self.sentence,
+            'score': self.score,
+            'components': self.components,
+            'source': self.source.url if self.source else None,
+            'offset': self.source.offset if self.source else None
+        }
+
+class SearchResult:
+    """Respuesta de search(): texto, confianza, los k mejores resultados y la latencia (ms) de cada etapa"""
+    __slots__ = ('query', 'response', 'confidence', 'hits', 'timings', 'corrections')
+    
+    def __init__(self, query, response, confidence, hits=None, timings=None, corrections=None):
+        self.query = query
+        self.response = response
+        self.confidence = confidence
+        self.hits = hits or []
+        self.timings = timings or {}
+        self.corrections = corrections or {}
+
+class SearchEngine:
+    # Modos de puntuación: 'bm25' usa el índice invertido, 'legacy' reproduce el puntaje aditivo 2/3/5/3 original
+    # (subcadenas sobre el texto plegado, sin raíces, correcciones ni entidades),
+    # 'tfidf' usa similitud coseno de n-gramas de caracteres (requiere NumPy)
+    SCORING_MODES = ('bm25', 'legacy', 'tfidf')
+    # Fracción de huecos a partir de la cual una recarga fusiona la generación en una sin huecos
+    MAX_DELETED_RATIO = 0.25
+    # Confianza mínima para responder con la mejor oración en lugar de una sugerencia
+    MIN_CONFIDENCE = 0.2
+    # Documentos en los que debe aparecer una raíz para proponerla como corrección
+    MIN_CORRECTION_DF = 2
+    # Factor de la confianza por cada término corregido (una corrección puede ser una palabra real);
+    # es la única penalización: el máximo teórico ya lleva la corrección con su menor peso
+    CORRECTION_PENALTY = 0.5
+    
+    def __init__(self, scoring_mode='bm25', snapshot_path=SNAPSHOT_PATH, pdf_paths=None, corpus_paths=None,
+                 scrape=True, autoload=True, dedup_threshold=0.8, metrics_hook=None, use_mmap=False,
+                 max_edits=2, sentences_path=SENTENCES_DB):
+        if scoring_mode not in self.SCORING_MODES:
+            raise ValueError(f"Modo de puntuación desconocido: {scoring_mode}")
+        if scoring_mode == 'tfidf' and import_numpy() is None:
+            raise ImportError("El modo 'tfidf' requiere NumPy (pip install numpy)")
+        
+        self.scoring_mode = scoring_mode
         self.query_processor = QueryProcessor()
-        self.knowledge_base = []
-        self.setup_knowledge_base()
+        # Doble buffer: las búsquedas leen self.state mientras una recarga construye el siguiente
+        self.state = SearchState(entities=EntityIndex(self.query_processor.tokenize))
+        self.cache = QueryCache()
+        # metrics_hook recibe el registro de cada búsqueda (p. ej. para un log estructurado)
+        self.metrics = SearchMetrics(metrics_hook)
+        # snapshot_path=None desactiva la persistencia
+        self.snapshot = KnowledgeSnapshot(snapshot_path, use_mmap=use_mmap) if snapshot_path else None
+        self.pdf_ingestor = PdfIngestor(pdf_paths)
+        self.corpus_loader = CorpusLoader(corpus_paths)
+        # Oraciones curadas a mano ({"sentences": [...]}); None las omite
+        self.sentences_path = sentences_path
+        # scrape=False construye solo con datos locales (sin red); autoload=False difiere la carga
+        self.scrape = scrape
+        # Similitud de Jaccard a partir de la cual dos oraciones se consideran la misma (None desactiva)
+        self.dedup = (NearDuplicateFilter(self.query_processor.tokenize, dedup_threshold)
+                      if dedup_threshold is not None else None)
+        self.dedup_seeded = False  # El filtro refleja la generación activa (falso tras cargar un snapshot)
+        # Ediciones toleradas al corregir términos fuera del vocabulario ("jagur" -> "jaguar"; 0 desactiva)
+        self.max_edits = max_edits
+        # Se activa cuando la base está al día: con autoload al terminar __init__, si no al terminar warm_up()
+        self.ready = threading.Event()
+        if autoload:
+            self.setup_knowledge_base()
+    
+    @property
+    def store(self):
+        return self.state.store
+    
+    @property
+    def knowledge_base(self):
+        return self.state.store
+    
+    @property
+    def index(self):
+        return self.state.index
     
-    def setup_knowledge_base(self):
-        """Configura la base de conocimiento con web scraping"""
+    def setup_knowledge_base(self, force=False):
+        """Configura la base de conocimiento desde el snapshot o, si hace falta, con web scraping"""
+        if not force and self.load_snapshot():
+            self.ready.set()
+            return
+        
         print("🚀 Inicializando base de conocimiento...")
+        sentences, scraped = self.collect_sentences()
+        state = self.build_state(sentences, self.dedup)
+        self.dedup_seeded = True
+        print(f"✅ Base de conocimiento cargada: {len(state)} oraciones")
+        if self.dedup and self.dedup.removed:
+            print(f"🧹 Casi-duplicados descartados: {self.dedup.removed}")
         
+        # El intercambio es una sola asignación: las búsquedas en curso terminan con la generación anterior
+        self.publish_state(state)
+        self.ready.set()
+        # Sin scraping no se guarda snapshot, para reintentar en el próximo arranque
+        if scraped:
+            self.save_snapshot()
+    
+    def reload_knowledge_base(self, refresh_snapshot=False):
+        """Vuelve a leer las fuentes y aplica solo las diferencias con la base activa
+        
+        refresh_snapshot guarda el snapshot aunque no haya diferencias (p. ej. si estaba vencido).
+        """
+        if not len(self.state):
+            self.setup_knowledge_base(force=True)
+            return
+        
+        start = time.perf_counter()
+        sentences, scraped = self.collect_sentences()
+        added, deleted = self.sync_documents(sentences)
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"🔄 Recarga incremental: +{added} / -{deleted} oraciones en {elapsed:.1f} ms "
+              f"({len(self.state)} en total)")
+        if scraped and (added or deleted or refresh_snapshot):
+            self.save_snapshot()
+    
+    def warm_up(self):
+        """Arranque diferido: publica enseguida el snapshot más reciente, aunque esté desactualizado,
+        y después sincroniza o reconstruye la base y construye el corrector mientras ya se responde
+        
+        Pensado para un hilo en segundo plano sobre un motor creado con autoload=False.
+        """
+        start = time.perf_counter()
+        fresh = self.load_snapshot(allow_stale=True, with_speller=False)
+        if not len(self.state):
+            self.setup_knowledge_base(force=True)
+        elif not fresh:
+            self.reload_knowledge_base(refresh_snapshot=True)
+        self.build_speller()
+        print(f"✅ Base lista en {(time.perf_counter() - start) * 1000:.1f} ms")
+        self.ready.set()
+    
+    def build_speller(self):
+        """Construye el corrector de la generación activa si se difirió (sin él solo no se corrige)"""
+        state = self.state
+        if self.max_edits and state.speller is None:
+            state.speller = FuzzyTermIndex(state.index.postings, self.max_edits)
+            # Las respuestas en caché se calcularon sin corrección
+            self.cache.clear()
+    
+    def collect_sentences(self):
+        """Flujo de (oración, fuente) de todas las fuentes y si alguna fuente web respondió"""
         # Datos de respaldo
         backup_data = [
             "El jaguar es el felino más grande de América y habita en la Amazonía boliviana",
@@ -215,90 +2176,845 @@ class SearchEngine:
         try:
             scraper = WebScraper()
             scraped_data = []
+            answered = 0
             
-            scraped_data.extend(scraper.scrape_wikipedia())
-            scraped_data.extend(scraper.scrape_biodiversidad_gob())
-            scraped_data.extend(scraper.scrape_fauna_bolivia())
+            if self.scrape:
+                web_data, answered = scraper.scrape_all()
+                scraped_data.extend(web_data)
+            scraped_data.extend((sentence, None) for sentence in scraper.scrape_biodiversidad_gob())
+            scraped_data.extend((sentence, None) for sentence in scraper.scrape_fauna_bolivia())
             
-            # Combinar datos
-            all_data = list(set(scraped_data + backup_data))  # Remover duplicados
-            self.knowledge_base = [s for s in all_data if s and len(s) > 20]
-            
-            print(f"✅ Base de conocimiento cargada: {len(self.knowledge_base)} oraciones")
+            # Combinar datos (unique_sentences quita los repetidos; gana la copia con URL)
+            knowledge_base = [(s, source) for s, source in scraped_data + [(s, None) for s in backup_data]
+                              if s and len(s) > 20]
+            # Sin ninguna respuesta de la web la base es incompleta: no se guarda como snapshot vigente
+            scraped = answered > 0
             
         except Exception as e:
             print(f"⚠️ Usando datos de respaldo: {e}")
-            self.knowledge_base = backup_data
+            knowledge_base = [(sentence, None) for sentence in backup_data]
+            scraped = False
+        
+        # El corpus estructurado y los PDFs entran al índice a medida que se leen
+        sentences = self.unique_sentences(knowledge_base,
+                                          self.curated_sentences(),
+                                          self.corpus_loader.iter_sentences(),
+                                          self.pdf_ingestor.iter_sentences())
+        return sentences, scraped
     
-    def search(self, query):
-        """Busca la mejor respuesta usando algoritmo híbrido"""
-        if not query or not self.knowledge_base:
-            return "No tengo información disponible en este momento.", 0.0
+    def curated_sentences(self):
+        """(oración, None) de la base curada; el archivo solo se lee, nunca se reescribe"""
+        if not self.sentences_path:
+            return []
+        try:
+            with open(self.sentences_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Error leyendo {self.sentences_path}: {e}")
+            return []
         
-        # Procesar consulta
-        clean_query = self.query_processor.clean_query(query)
-        keywords = self.query_processor.extract_keywords(query)
+        sentences = data.get('sentences') if isinstance(data, dict) else None
+        if not isinstance(sentences, list):
+            return []
+        return [(sentence, None) for sentence in sentences if isinstance(sentence, str) and len(sentence) > 20]
+    
+    def sync_documents(self, sentences):
+        """Compara el contenido completo de las fuentes con la base activa y aplica solo las diferencias
         
-        print(f"🔍 Búsqueda: '{query}' -> '{clean_query}'")
-        print(f"🎯 Keywords: {keywords}")
+        Cada documento se identifica por (URL, hash del contenido): una oración que cambia
+        en una página es una baja más un alta, y lo que no cambió no se vuelve a tokenizar.
+        Devuelve el número de (altas, bajas) aplicadas.
+        """
+        state = self.state
+        if self.dedup and not self.dedup_seeded:
+            self.dedup.seed((key, state.store[doc_id], state.store.sources[doc_id])
+                            for key, doc_id in state.doc_ids.items())
+            self.dedup_seeded = True
         
-        if not clean_query:
-            return "No entendí tu pregunta. ¿Podrías reformular?", 0.0
+        incoming = {}
+        for sentence, source in sentences:
+            incoming.setdefault(document_key(sentence, source), (sentence, source))
         
-        # Búsqueda semántica mejorada
-        best_match = None
-        best_score = 0
+        deletes = [key for key in state.doc_ids if key not in incoming]
+        live = state.doc_ids.keys() - set(deletes)
+        adds = []
+        for key, pair in incoming.items():
+            if key in state.doc_ids:
+                continue
+            # Un casi-duplicado ya descartado solo vuelve si su representante desaparece
+            if self.dedup and self.dedup.covered(key, live):
+                continue
+            adds.append(pair)
         
-        for sentence in self.knowledge_base:
-            sentence_lower = sentence.lower()
-            score = 0
-            
-            # Coincidencia exacta de palabras
-            for word in clean_query.split():
-                if word in sentence_lower:
-                    score += 2
-            
-            # Bonus por coincidencia de frases
-            if any(keyword in sentence_lower for keyword in keywords['all']):
-                score += 3
+        if self.dedup:
+            self.dedup.suppressed = {key: other for key, other in self.dedup.suppressed.items()
+                                     if key in incoming}
+        if not adds and not deletes:
+            return 0, 0
+        
+        new_state = self.apply_changes(state, adds, deletes)
+        added = len(new_state.doc_ids.keys() - state.doc_ids.keys())
+        deleted = len(state.doc_ids.keys() - new_state.doc_ids.keys())
+        if added or deleted:
+            self.publish_state(new_state)
+        return added, deleted
+    
+    def apply_changes(self, state, adds=(), deletes=()):
+        """Nueva generación con las bajas (claves) y altas ((oración, fuente)) aplicadas sobre una copia"""
+        state = state.copy()
+        tokenize = self.query_processor.tokenize
+        for key in deletes:
+            doc_id = state.doc_ids.get(key)
+            if doc_id is not None:
+                state.remove(doc_id, tokenize(state.store[doc_id]))
+            if self.dedup:
+                self.dedup.discard(key)
+        
+        for sentence, source in adds:
+            self.add_document(state, sentence, source, self.dedup)
+        
+        # La matriz TF-IDF se reconstruye igual (vectorizada), así que en ese modo siempre se fusiona
+        if state.deleted > self.MAX_DELETED_RATIO * len(state.store) or (
+                state.deleted and self.scoring_mode == 'tfidf'):
+            state = state.compacted()
+        if self.scoring_mode == 'tfidf':
+            state.tfidf = TfidfScorer()
+            state.tfidf.build(state.store)
+        return state
+    
+    def unique_sentences(self, *streams):
+        """Encadena flujos de (oración, fuente) descartando repeticiones exactas"""
+        seen = set()
+        for stream in streams:
+            for sentence, source in stream:
+                if sentence and sentence not in seen:
+                    seen.add(sentence)
+                    yield sentence, source
+    
+    def source_files(self):
+        """Archivos locales de los que depende la base (oraciones curadas, PDFs y corpus)"""
+        files = self.pdf_ingestor.source_files()
+        files.update(self.corpus_loader.source_files())
+        if self.sentences_path and os.path.exists(self.sentences_path):
+            files[self.sentences_path] = os.path.getsize(self.sentences_path)
+        return files
+    
+    def load_snapshot(self, allow_stale=False, with_speller=True):
+        """Carga oraciones e índice desde el snapshot; devuelve False si hay que reconstruir o sincronizar
+        
+        Con allow_stale también se publica un snapshot desactualizado (y se devuelve False).
+        """
+        if not self.snapshot:
+            return False
+        
+        start = time.perf_counter()
+        data = self.snapshot.load(self.source_files(), allow_stale)
+        if not data:
+            return False
+        
+        self.publish_state(self.make_state(data['store'], InvertedIndex.from_dict(data['index']),
+                                           EntityIndex.from_dict(self.query_processor.tokenize, data['entities']),
+                                           with_speller))
+        self.dedup_seeded = False
+        elapsed = (time.perf_counter() - start) * 1000
+        stale = " (desactualizado)" if data['stale'] else ""
+        print(f"⚡ Snapshot cargado{stale}: {len(self.state)} oraciones en {elapsed:.1f} ms")
+        return not data['stale']
+    
+    def save_snapshot(self):
+        """Guarda la base actual para el próximo arranque"""
+        if not self.snapshot:
+            return
+        
+        try:
+            state = self.state
+            if state.deleted:
+                state = state.compacted()
+            self.snapshot.save(state.store, state.index, state.entities, self.source_files())
+        except OSError as e:
+            print(f"⚠️ No se pudo guardar el snapshot: {e}")
+    
+    def publish_state(self, state):
+        """Reemplaza la generación activa e invalida la caché de consultas"""
+        # Primero la base y después la invalidación: quien leyó la generación de la caché
+        # antes que la base vieja no podrá guardar su resultado
+        self.state = state
+        self.cache.clear()
+    
+    def build_state(self, sentences, dedup=None):
+        """Tokeniza y pliega cada (oración, fuente) una sola vez, a medida que llega, y construye una nueva generación
+        
+        Con dedup los casi-duplicados se filtran también al llegar: una oración entra al
+        índice enseguida y, si después aparece una copia mejor, se reemplaza en ese momento
+        (su doc_id queda como hueco y la generación se fusiona al final).
+        """
+        state = SearchState(entities=EntityIndex(self.query_processor.tokenize))
+        if dedup:
+            dedup.reset()
+        for sentence, source in sentences:
+            self.add_document(state, sentence, source, dedup)
+        if state.deleted:
+            state = state.compacted()
+        return self.make_state(state.store, state.index, state.entities)
+    
+    def add_document(self, state, sentence, source, dedup=None):
+        """Agrega (oración, fuente) a una generación en construcción, pasando por el filtro de casi-duplicados"""
+        key = document_key(sentence, source)
+        if key in state.doc_ids:
+            return
+        tokenize = self.query_processor.tokenize
+        tokens = tokenize(sentence)
+        if dedup:
+            verdict, other = dedup.offer(key, sentence, source, tokens)
+            if verdict == 'duplicate':
+                return
+            # La copia nueva es mejor: el representante anterior sale del índice
+            if verdict == 'replace' and other in state.doc_ids:
+                doc_id = state.doc_ids[other]
+                state.remove(doc_id, tokenize(state.store[doc_id]))
+        state.add(key, sentence, source, tokens, self.query_processor.fold(sentence))
+    
+    def make_state(self, store, index, entities, with_speller=True):
+        """Generación a partir de un almacén y sus índices, con las estructuras propias del modo
+        
+        with_speller=False deja el corrector para build_speller() (arranque diferido).
+        """
+        tfidf = None
+        if self.scoring_mode == 'tfidf':
+            tfidf = TfidfScorer()
+            tfidf.build(store)
+        state = SearchState(store, index, tfidf, entities)
+        if self.max_edits and with_speller:
+            state.speller = FuzzyTermIndex(index.postings, self.max_edits)
+        return state
+    
+    def search(self, query, k=5):
+        """Busca la mejor respuesta y los k mejores resultados, midiendo cada etapa"""
+        # La generación de la caché se lee antes que la base: publish_state asigna y después invalida
+        generation = self.cache.generation
+        state = self.state
+        if not query or not state.store:
+            return SearchResult(query, "No tengo información disponible en este momento.", 0.0)
+        
+        timings = dict.fromkeys(SearchMetrics.STAGES, 0.0)
+        start = time.perf_counter()
+        
+        # Procesar consulta
+        parsed = self.parse(state, query)
+        logger.debug("🔍 Búsqueda: '%s' -> '%s'", query, parsed)
+        normalized = time.perf_counter()
+        timings['normalize'] = (normalized - start) * 1000
+        
+        hits, confidence = [], 0.0
+        if not parsed:
+            response = "No entendí tu pregunta. ¿Podrías reformular?"
+        else:
+            # Los k mejores salen de un heap; solo ellos se desglosan por señal
+            ranked, max_possible_score = self.rank(state, parsed, k, generation)
+            retrieved = time.perf_counter()
+            hits = [self.make_hit(state, parsed, doc_id, score) for doc_id, score in ranked]
+            confidence = self.confidence(ranked, max_possible_score, parsed)
+            response = self.format_answer(state, ranked[0][0]) if confidence > self.MIN_CONFIDENCE else None
+            scored = time.perf_counter()
+            timings['retrieve'] = (retrieved - normalized) * 1000
+            timings['score'] = (scored - retrieved) * 1000
             
-            # Bonus extra por especies y regiones
-            if any(species in sentence_lower for species in keywords['especies']):
-                score += 5
-            if any(region in sentence_lower for region in keywords['regiones']):
-                score += 3
+            if response is None:
+                response, confidence = self.get_fallback_response(state, parsed), 0.0
+                timings['fallback'] = (time.perf_counter() - scored) * 1000
+        
+        self.metrics.record({'query': query, 'mode': self.scoring_mode, 'stages': timings,
+                             'hits': len(hits), 'confidence': confidence})
+        return SearchResult(query, response, confidence, hits, timings, parsed.corrections)
+    
+    def respond(self, state, ranked, max_possible_score, parsed):
+        """Convierte un ranking de (doc_id, puntaje) en (respuesta, confianza) aplicando el umbral"""
+        confidence = self.confidence(ranked, max_possible_score, parsed)
+        if confidence > self.MIN_CONFIDENCE:
+            return self.format_answer(state, ranked[0][0]), confidence
+        return self.get_fallback_response(state, parsed), 0.0
+    
+    def confidence(self, ranked, max_possible_score, parsed):
+        """Puntaje del mejor resultado relativo al máximo teórico, en [0, 1], penalizado por corrección"""
+        best_score = ranked[0][1] if ranked else 0
+        penalty = self.CORRECTION_PENALTY ** len(parsed.corrections)
+        return min(best_score / max(1, max_possible_score), 1.0) * penalty
+    
+    def format_answer(self, state, doc_id):
+        """Oración de respuesta con la cita de su fuente"""
+        response = state.store[doc_id]
+        source = state.store.sources[doc_id]
+        if source:
+            response = f"{response}\n{source.citation()}"
+        return response
+    
+    def search_top_k(self, query, k=5):
+        """Devuelve las k mejores oraciones como lista de (oración, puntaje)"""
+        generation = self.cache.generation
+        state = self.state
+        if not query or not state.store:
+            return []
+        
+        parsed = self.parse(state, query)
+        if not parsed:
+            return []
+        
+        ranked, _ = self.rank(state, parsed, k, generation)
+        return [(state.store[doc_id], score) for doc_id, score in ranked]
+    
+    def answer(self, query, k=5):
+        """Respuesta, confianza y alternativas de una consulta (formato del servicio HTTP)"""
+        return self.answer_batch([query], k)[0]
+    
+    def answer_batch(self, queries, k=5):
+        """Responde varias consultas con una sola pasada sobre el índice"""
+        generation = self.cache.generation
+        state = self.state
+        results = [{'query': query, 'response': None, 'confidence': 0.0, 'alternatives': [], 'corrections': {}}
+                   for query in queries]
+        start = time.perf_counter()
+        
+        pending = []
+        for result in results:
+            query = result['query']
+            if not query or not state.store:
+                result['response'] = "No tengo información disponible en este momento."
+                continue
             
-            if score > best_score:
-                best_score = score
-                best_match = sentence
+            parsed = self.parse(state, query)
+            result['corrections'] = parsed.corrections
+            if not parsed:
+                result['response'] = "No entendí tu pregunta. ¿Podrías reformular?"
+                continue
+            pending.append((result, parsed))
+        normalized = time.perf_counter()
+        
+        # Solo las consultas que no están en caché pasan por el índice
+        rankings = [self.cache.get(self.cache_key(parsed, k)) for _, parsed in pending]
+        misses = [i for i, ranking in enumerate(rankings) if ranking is None]
+        if self.scoring_mode == 'legacy':
+            for i in misses:
+                rankings[i] = self.compute_rank(state, pending[i][1], k)
+        elif misses and self.scoring_mode == 'tfidf':
+            batch = state.tfidf.search_batch([pending[i][1].phrase for i in misses], k)
+            for i, ranked in zip(misses, batch):
+                rankings[i] = (ranked, 1.0)
+        elif misses:
+            batch = state.index.search_batch([pending[i][1].weights for i in misses], k,
+                                             [self.facet_documents(state, pending[i][1]) for i in misses])
+            for i, ranked in zip(misses, batch):
+                rankings[i] = (ranked, state.index.max_score(pending[i][1].ceiling))
+        
+        for i in misses:
+            self.cache.put(self.cache_key(pending[i][1], k), rankings[i], generation)
+        retrieved = time.perf_counter()
+        
+        for (result, parsed), (ranked, max_possible_score) in zip(pending, rankings):
+            result['response'], result['confidence'] = self.respond(state, ranked, max_possible_score, parsed)
+            result['alternatives'] = [self.make_hit(state, parsed, doc_id, score).to_dict()
+                                      for doc_id, score in ranked]
+        
+        # En lote, las respuestas alternativas se cuentan dentro de 'score'
+        self.metrics.record({'mode': self.scoring_mode, 'queries': len(queries), 'stages': {
+            'normalize': (normalized - start) * 1000,
+            'retrieve': (retrieved - normalized) * 1000,
+            'score': (time.perf_counter() - retrieved) * 1000
+        }})
+        return results
+    
+    def parse(self, state, query):
+        """Normaliza la consulta corrigiendo los términos que no están en el vocabulario de la generación
         
-        # Calcular confianza
-        max_possible_score = len(clean_query.split()) * 2 + 8  # Máximo teórico
-        confidence = min(best_score / max(1, max_possible_score), 1.0)
+        El modo 'legacy' conserva las reglas originales: no corrige.
+        """
+        if self.scoring_mode == 'legacy':
+            return self.query_processor.parse(query)
+        return self.query_processor.parse(query, lambda term: self.correction(state, term))
+    
+    def correction(self, state, term):
+        """(raíz, palabra) del vocabulario para un término desconocido, o None"""
+        corrected = self.correct_term(state, term)
+        return (corrected, self.vocabulary_word(state, corrected)) if corrected else None
+    
+    def vocabulary_word(self, state, term, sample=20):
+        """Forma escrita más frecuente de una raíz en las oraciones que la contienen ("titicac" -> "titicaca")"""
+        processor = self.query_processor
+        counts = {}
+        for doc_id in itertools.islice(state.index.postings.get(term, ()), sample):
+            for word in WORD_PATTERN.findall(state.store[doc_id].lower()):
+                if processor.stem(processor.fold(word)) == term:
+                    counts[word] = counts.get(word, 0) + 1
+        return max(counts, key=counts.get) if counts else term
+    
+    def correct_term(self, state, term):
+        """Raíz del vocabulario más cercana a un término desconocido (None si lo conoce o no hay ninguna)
+        
+        Se admite 1 edición por debajo de 7 letras y max_edits en términos más largos, y
+        solo se proponen raíces de al menos MIN_CORRECTION_DF documentos; entre candidatos
+        a la misma distancia gana el que aparece en más documentos.
+        """
+        postings = state.index.postings
+        if term in postings or len(term) < 5:
+            return None
         
-        # Umbrales de confianza
-        if best_match and confidence > 0.2:
-            return best_match, confidence
+        speller = state.speller
+        if speller is None:
+            return None
+        max_distance = 1 if len(term) < 7 else self.max_edits
+        matches = [(distance, -len(postings[match]), match)
+                   for match, distance in speller.lookup(term, max_distance)
+                   if len(postings.get(match, ())) >= self.MIN_CORRECTION_DF]
+        return min(matches)[2] if matches else None
+    
+    def make_hit(self, state, parsed, doc_id, score):
+        """Resultado con el aporte de cada señal al puntaje según el modo"""
+        if self.scoring_mode == 'legacy':
+            components = self.legacy_components(state.store.folded_at(doc_id).__contains__,
+                                                self.query_processor.extract_keywords(parsed.text))
+        elif self.scoring_mode == 'tfidf':
+            components = {'coseno': score}
         else:
-            return self.get_fallback_response(keywords), 0.0
-    
-    def get_fallback_response(self, keywords):
-        """Respuesta cuando no se encuentra buena coincidencia"""
-        if keywords['especies']:
-            species = keywords['especies'][0]
-            return f"¿Te interesa saber más sobre el {species}? Pregunta sobre su hábitat, alimentación o estado de conservación."
-        elif keywords['regiones']:
-            region = keywords['regiones'][0]
-            return f"¿Quieres conocer la biodiversidad de la región {region}? Pregunta sobre animales o plantas específicos de esta zona."
+            components = state.index.explain(doc_id, parsed.weights)
+        return SearchHit(doc_id, state.store[doc_id], state.store.sources[doc_id], score, components)
+    
+    def cache_key(self, parsed, k):
+        """Clave de caché: raíces expandidas y originales, que deciden las entidades (las paráfrasis comparten entrada)
+        
+        En modo 'legacy' las palabras se buscan como subcadenas, así que la clave son las palabras escritas.
+        """
+        if self.scoring_mode == 'legacy':
+            return frozenset(self.query_processor.words(parsed.text)), k
+        return frozenset(parsed.expanded), frozenset(parsed.terms), k
+    
+    def rank(self, state, parsed, k=1, generation=None):
+        """Ranking con caché; devuelve ([(doc_id, puntaje)], máximo teórico)
+        
+        generation es la de la caché leída antes que state; sin ella el resultado no se guarda.
+        """
+        key = self.cache_key(parsed, k)
+        ranking = self.cache.get(key)
+        if ranking is None:
+            ranking = self.compute_rank(state, parsed, k)
+            # No se guarda un resultado calculado sobre una generación ya reemplazada
+            if generation is not None:
+                self.cache.put(key, ranking, generation)
+        return ranking
+    
+    def compute_rank(self, state, parsed, k=1):
+        """Ordena una generación según el modo de puntuación; devuelve ([(doc_id, puntaje)], máximo teórico)"""
+        if self.scoring_mode == 'legacy':
+            keywords = self.query_processor.extract_keywords(parsed.text)
+            return self.rank_legacy(state, keywords, k), len(keywords['all']) * 2 + 8
+        if self.scoring_mode == 'tfidf':
+            # La similitud coseno ya está en [0, 1]
+            return state.tfidf.search(parsed.phrase, k), 1.0
+        
+        # Los sinónimos suman puntaje pero el máximo se calcula con los términos escritos (o sus correcciones)
+        return (state.index.search(parsed.weights, k, self.facet_documents(state, parsed)),
+                state.index.max_score(parsed.ceiling))
+    
+    def facet_documents(self, state, parsed):
+        """Documentos que mencionan todas las entidades de la consulta, o None si no hay ninguno
+        
+        "animales en peligro en la Amazonía" se resuelve intersectando los postings
+        de 'en peligro' y 'Amazonía'; si la intersección está vacía se rankea todo.
+        """
+        facets = state.entities.match(parsed.terms)
+        if not facets:
+            return None
+        return state.entities.documents(facets) or None
+    
+    def rank_legacy(self, state, keywords, k=1):
+        """Puntaje aditivo original; cada palabra clave se busca una sola vez en el buffer plegado"""
+        matches = {word: state.store.find_docs(word) for word in keywords['all']}
+        
+        scored = []
+        for doc_id in sorted(set().union(*matches.values())):
+            score = sum(self.legacy_components(lambda word: doc_id in matches[word], keywords).values())
+            if score > 0:
+                scored.append((doc_id, score))
+        
+        # nlargest es estable: a igual puntaje gana la primera oración, como en el recorrido original
+        return heapq.nlargest(k, scored, key=lambda item: item[1])
+    
+    def legacy_components(self, contains, keywords):
+        """Señales del puntaje aditivo; contains(palabra) busca la subcadena en la oración plegada"""
+        components = {}
+        
+        # Coincidencia exacta de palabras
+        words = sum(2 for word in keywords['all'] if contains(word))
+        if words:
+            components['palabras'] = words
+        
+        # Bonus por coincidencia de frases
+        if any(contains(keyword) for keyword in keywords['all']):
+            components['frase'] = 3
+        
+        # Bonus extra por especies y regiones
+        if any(contains(species) for species in keywords['especies']):
+            components['especies'] = 5
+        if any(contains(region) for region in keywords['regiones']):
+            components['regiones'] = 3
+        return components
+    
+    def get_fallback_response(self, state, parsed):
+        """Respuesta cuando no se encuentra buena coincidencia (sugiere entidades presentes en la base)"""
+        entities = state.entities
+        facets = entities.match(parsed.terms)
+        if facets.get('especies'):
+            species = facets['especies'][0]
+            regions = entities.top('regiones', 3, entities.postings.get(species, set()))
+            where = f" En la base aparece en: {', '.join(regions)}." if regions else ""
+            return f"¿Te interesa saber más sobre {species[1]}?{where} Pregunta sobre su hábitat, alimentación o estado de conservación."
+        elif facets.get('regiones'):
+            region = facets['regiones'][0]
+            species = entities.top('especies', 3, entities.postings.get(region, set()))
+            examples = f" Por ejemplo: {', '.join(species)}." if species else ""
+            return f"¿Quieres conocer la biodiversidad de la región {region[1]}? Pregunta sobre animales o plantas específicos de esta zona.{examples}"
+        
+        within = (entities.documents(facets) or None) if facets else None
+        species, regions = entities.top('especies', 3, within), entities.top('regiones', 3, within)
+        if species and regions:
+            return f"Pregúntame sobre especies como {', '.join(species)} o regiones como {', '.join(regions)}"
         else:
             fallbacks = [
                 "¿Podrías ser más específico? Por ejemplo: 'jaguar', 'condor andino', 'animales en peligro'",
                 "Pregúntame sobre especies específicas como jaguar, cóndor, oso andino, o regiones como Amazonía, Altiplano",
                 "Intenta con: 'especies en peligro', 'fauna amazónica', 'flora andina', 'parques nacionales'"
             ]
-            import random
             return random.choice(fallbacks)
 
+class SearchService:
+    """Aplicación WSGI sin interfaz gráfica que expone SearchEngine por HTTP
+    
+    GET  /health                      -> estado y número de oraciones
+    GET  /search?q=...&k=5            -> respuesta, confianza y alternativas
+    POST /search  {"query", "k"}      -> igual que GET
+    POST /batch   {"queries", "k"}    -> lista de respuestas puntuadas en una sola pasada
+    """
+    def __init__(self, search_engine, max_k=20, max_batch=256):
+        self.search_engine = search_engine
+        self.max_k = max_k
+        self.max_batch = max_batch
+    
+    def __call__(self, environ, start_response):
+        method = environ.get('REQUEST_METHOD', 'GET')
+        path = environ.get('PATH_INFO', '/')
+        try:
+            if path == '/health' and method == 'GET':
+                body = {'status': 'ok', 'ready': self.search_engine.ready.is_set(),
+                        'sentences': len(self.search_engine.state),
+                        'cache': self.search_engine.cache.stats(),
+                        'latency': self.search_engine.metrics.stats()}
+            elif path == '/search' and method in ('GET', 'POST'):
+                params = self.read_params(environ, method)
+                query = params.get('query', params.get('q', ''))
+                if not isinstance(query, str):
+                    raise ValueError("'query' debe ser un texto")
+                body = self.search_engine.answer(query, self.read_k(params))
+            elif path == '/batch' and method == 'POST':
+                params = self.read_params(environ, method)
+                queries = params.get('queries')
+                if (not isinstance(queries, list) or len(queries) > self.max_batch
+                        or not all(isinstance(query, str) for query in queries)):
+                    raise ValueError(f"'queries' debe ser una lista de hasta {self.max_batch} textos")
+                body = {'results': self.search_engine.answer_batch(queries, self.read_k(params))}
+            else:
+                return self.reply(start_response, '404 Not Found', {'error': 'Ruta no encontrada'})
+        except ValueError as e:
+            return self.reply(start_response, '400 Bad Request', {'error': str(e)})
+        
+        return self.reply(start_response, '200 OK', body)
+    
+    def read_params(self, environ, method):
+        """Lee los parámetros de la URL (GET) o del cuerpo JSON (POST)"""
+        if method == 'GET':
+            return {key: values[0] for key, values in parse_qs(environ.get('QUERY_STRING', '')).items()}
+        
+        try:
+            length = int(environ.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            length = 0
+        data = json.loads(environ['wsgi.input'].read(length) or b'{}')
+        if not isinstance(data, dict):
+            raise ValueError("Se esperaba un objeto JSON")
+        return data
+    
+    def read_k(self, params):
+        """Número de alternativas pedido, acotado a max_k"""
+        try:
+            k = int(params.get('k', 5))
+        except (TypeError, ValueError, OverflowError):
+            raise ValueError("'k' debe ser un número entero")
+        return max(1, min(k, self.max_k))
+    
+    def reply(self, start_response, status, body):
+        """Serializa la respuesta como JSON UTF-8"""
+        payload = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        start_response(status, [('Content-Type', 'application/json; charset=utf-8'),
+                                ('Content-Length', str(len(payload)))])
+        return [payload]
+
+def make_search_server(app, host, port):
+    """Servidor WSGI con un hilo por petición; wsgiref solo se importa en modo servicio"""
+    from socketserver import ThreadingMixIn
+    from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+    
+    class QuietHandler(WSGIRequestHandler):
+        """Manejador sin log por petición (el log en stderr limita el throughput)"""
+        def log_message(self, format, *args):
+            pass
+    
+    class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+        daemon_threads = True
+        request_queue_size = 128
+    
+    return make_server(host, port, app, server_class=ThreadingWSGIServer, handler_class=QuietHandler)
+
+class ConversationLog:
+    """Registro de conversaciones solo de anexado (JSON Lines) con escritura por lotes y rotación
+    
+    append() solo encola el turno; un hilo propio agrupa los turnos que llegan juntos
+    (hasta batch_size o flush_interval segundos) en una única escritura. Cuando el archivo
+    supera max_bytes se rota como path.1, path.2, ... conservando `backups` copias.
+    """
+    def __init__(self, path=CONVERSATION_LOG, max_bytes=1024 * 1024, backups=3, batch_size=32,
+                 flush_interval=1.0, legacy_path=CONVERSATION_MEMORY):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.legacy_path = legacy_path
+        self.queue = queue.Queue()
+        self.thread = None
+        self.lock = threading.Lock()
+    
+    def append(self, turn):
+        """Encola un turno (dict) para escribirlo en segundo plano"""
+        with self.lock:
+            if self.thread is None:
+                # El hilo se crea con el primer turno: leer el historial no lo necesita
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+        self.queue.put(turn)
+    
+    def close(self, timeout=5):
+        """Escribe los turnos pendientes y detiene el hilo de escritura"""
+        with self.lock:
+            thread, self.thread = self.thread, None
+        if thread is not None:
+            self.queue.put(None)
+            thread.join(timeout)
+    
+    def run(self):
+        """Bucle del hilo de escritura: un lote por escritura"""
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while batch[-1] is not None and len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            
+            turns = [turn for turn in batch if turn is not None]
+            if turns:
+                try:
+                    self.write(turns)
+                except OSError as e:
+                    print(f"⚠️ No se pudo guardar la conversación: {e}")
+            if batch[-1] is None:
+                return
+    
+    def write(self, turns):
+        """Anexa un lote de turnos; rota entre líneas cuando el archivo se pasaría de max_bytes"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            size = 0
+        
+        chunk = []
+        for turn in turns:
+            line = (json.dumps(turn, ensure_ascii=False) + '\n').encode('utf-8')
+            if size and size + len(line) > self.max_bytes:
+                self.flush(chunk)
+                self.rotate()
+                chunk, size = [], 0
+            chunk.append(line)
+            size += len(line)
+        self.flush(chunk)
+    
+    def flush(self, lines):
+        if lines:
+            with open(self.path, 'ab') as f:
+                f.write(b''.join(lines))
+    
+    def rotate(self):
+        """path -> path.1 -> path.2 ...; la copia más antigua se descarta"""
+        if self.backups <= 0:
+            os.remove(self.path)
+            return
+        for number in range(self.backups - 1, 0, -1):
+            source = f"{self.path}.{number}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{number + 1}")
+        os.replace(self.path, f"{self.path}.1")
+    
+    def iter_turns(self):
+        """Historial completo en orden: el JSON heredado, las copias rotadas y el archivo actual"""
+        try:
+            with open(self.legacy_path, 'r', encoding='utf-8') as f:
+                yield from json.load(f).get('conversations', [])
+        except (OSError, ValueError):
+            pass
+        
+        paths = [f"{self.path}.{number}" for number in range(self.backups, 0, -1)] + [self.path]
+        for path in paths:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        try:
+                            yield json.loads(line)
+                        except ValueError:
+                            continue  # Línea truncada por un cierre abrupto
+            except OSError:
+                continue
+    
+    def tail(self, count, chunk_size=64 * 1024):
+        """Últimos `count` turnos del archivo actual, leyendo solo su final"""
+        try:
+            with open(self.path, 'rb') as f:
+                f.seek(0, os.SEEK_END)
+                start = max(0, f.tell() - chunk_size)
+                f.seek(start)
+                lines = f.read().split(b'\n')
+        except OSError:
+            return []
+        
+        turns = []
+        for line in lines[1:] if start else lines:  # La primera línea puede estar cortada
+            try:
+                turns.append(json.loads(line))
+            except ValueError:
+                continue
+        return turns[-count:]
+
+class ConversationMemory:
+    """Turnos recientes en memoria con las entidades mencionadas, para resolver preguntas de seguimiento
+    
+    Cada turno se anexa al ConversationLog; en memoria solo quedan los últimos
+    `recent_size` turnos y un índice entidad -> último turno que la mencionó, así que
+    "¿y su hábitat?" se completa con la entidad más reciente sin recorrer el historial.
+    """
+    # "¿y ...?", "su/sus ...", demostrativos y pronombres: la pregunta se apoya en el turno anterior
+    FOLLOW_UP = re.compile(r'^\W*(?:y|e|pero|entonces)\b|\b(?:su|sus|este|esta|estos|estas|ese|esa|esos|esas|'
+                           r'él|ella|ellos|ellas|allí|ahí)\b', re.IGNORECASE)
+    
+    def __init__(self, search_engine, log=None, recent_size=50):
+        self.search_engine = search_engine
+        self.log = log
+        self.recent = deque(maxlen=recent_size)
+        self.entities = OrderedDict()  # entidad -> número del último turno que la menciona
+        self.turns = 0
+        self.lock = threading.Lock()
+        if log is not None:
+            for turn in log.tail(recent_size):
+                self.remember(turn)
+    
+    def entities_of(self, text):
+        """Nombres canónicos de las especies y luego las regiones del índice de entidades que menciona un texto"""
+        engine = self.search_engine
+        facets = engine.state.entities.match(engine.query_processor.tokenize(text))
+        return [name for category in ('especies', 'regiones') for _, name in facets.get(category, ())]
+    
+    def last_entity(self):
+        with self.lock:
+            return next(reversed(self.entities), None)
+    
+    def resolve(self, question):
+        """Completa una pregunta de seguimiento sin entidad propia con la última entidad mencionada"""
+        if self.entities_of(question) or not self.FOLLOW_UP.search(question):
+            return question
+        entity = self.last_entity()
+        return f"{question} {entity}" if entity else question
+    
+    def record(self, question, result):
+        """Guarda un turno; sus entidades salen solo de la consulta resuelta (o la escrita), nunca de la respuesta
+        
+        Una respuesta que habla de otra especie no cambia el tema de la conversación.
+        """
+        entities = self.entities_of(result.query or question)
+        
+        turn = {
+            'timestamp': datetime.now().isoformat(),
+            'question': question,
+            'answer': result.response,
+            'confidence': result.confidence,
+            'entities': entities
+        }
+        self.remember(turn)
+        if self.log is not None:
+            self.log.append(turn)
+        return turn
+    
+    def remember(self, turn):
+        """Agrega un turno al índice en memoria, descartando las entidades que ya salieron de la ventana"""
+        with self.lock:
+            self.turns += 1
+            self.recent.append(turn)
+            # En orden inverso: la primera entidad del turno (la especie, si hay) queda como la más reciente
+            for entity in reversed(turn.get('entities', ())):
+                self.entities[entity] = self.turns
+                self.entities.move_to_end(entity)
+            
+            oldest = self.turns - len(self.recent)
+            while self.entities and next(iter(self.entities.values())) <= oldest:
+                self.entities.popitem(last=False)
+
+class BackgroundWorker:
+    """Ejecuta tareas en un hilo propio y entrega los resultados al hilo de Tk con root.after"""
+    def __init__(self, root, on_error, poll_ms=50):
+        self.root = root
+        self.on_error = on_error
+        self.poll_ms = poll_ms
+        self.tasks = queue.Queue()
+        self.results = queue.Queue()
+        threading.Thread(target=self.run, daemon=True).start()
+        self.root.after(self.poll_ms, self.poll)
+    
+    def submit(self, func, callback, *args):
+        """Encola func(*args); callback(resultado) se ejecuta luego en el hilo de Tk"""
+        self.tasks.put((func, args, callback))
+    
+    def run(self):
+        """Bucle del hilo de trabajo: nunca toca widgets de Tk"""
+        while True:
+            func, args, callback = self.tasks.get()
+            try:
+                self.results.put((callback, func(*args), None))
+            except Exception as e:
+                self.results.put((callback, None, e))
+    
+    def poll(self):
+        """Entrega los resultados pendientes en el hilo de Tk"""
+        while True:
+            try:
+                callback, result, error = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if error is not None:
+                self.on_error(error)
+            else:
+                callback(result)
+        self.root.after(self.poll_ms, self.poll)
+
 class ChatbotGUI:
     def __init__(self, root):
         self.root = root
@@ -306,9 +3022,16 @@ class ChatbotGUI:
         self.root.geometry("700x550")
         self.root.configure(bg='#f0f0f0')
         
-        self.search_engine = SearchEngine()
+        # La base se carga en segundo plano: la ventana aparece sin esperar al índice
+        self.search_engine = SearchEngine(autoload=False)
+        self.memory = ConversationMemory(self.search_engine, ConversationLog())
+        # Búsquedas y recargas en hilos separados: una recarga no bloquea las consultas
+        self.query_worker = BackgroundWorker(root, self.show_error)
+        self.reload_worker = BackgroundWorker(root, self.show_error)
+        self.reloading = True  # La carga inicial cuenta como una recarga en curso
         self.setup_ui()
         self.show_welcome()
+        self.reload_worker.submit(self.search_engine.warm_up, self.warm_up_finished)
     
     def setup_ui(self):
         """Configura la interfaz de usuario"""
@@ -401,15 +3124,31 @@ class ChatbotGUI:
         self.add_message("👤 Tú", user_text)
         self.user_input.delete(0, tk.END)
         
-        # Obtener respuesta
-        response, confidence = self.search_engine.search(user_text)
-        
+        # Obtener respuesta fuera del hilo de Tk
+        self.query_worker.submit(self.answer_turn, self.show_response, user_text)
+    
+    def answer_turn(self, user_text):
+        """Resuelve el contexto, busca y registra el turno (en el hilo de consultas)"""
+        result = self.search_engine.search(self.memory.resolve(user_text))
+        self.memory.record(user_text, result)
+        return result
+    
+    def show_response(self, result):
+        """Muestra la respuesta del motor de búsqueda y por qué ganó"""
         # Mostrar respuesta
-        self.add_message("🤖 Bot", response)
+        self.add_message("🤖 Bot", result.response)
         
         # Mostrar métricas
         self.chat_area.config(state=tk.NORMAL)
-        self.chat_area.insert(tk.END, f"📊 Confianza: {confidence:.2f}\n")
+        if result.corrections:
+            corrected = ", ".join(f"{word} → {correction}" for word, correction in result.corrections.items())
+            self.chat_area.insert(tk.END, f"✏️ Corregido: {corrected}\n")
+        self.chat_area.insert(tk.END, f"📊 Confianza: {result.confidence:.2f} | "
+                                      f"⏱️ {sum(result.timings.values()):.1f} ms\n")
+        if result.confidence and result.hits:
+            best = result.hits[0]
+            signals = " · ".join(f"{name} {value:.2f}" for name, value in best.components.items())
+            self.chat_area.insert(tk.END, f"🧮 Puntaje {best.score:.2f}: {signals}\n")
         self.chat_area.insert(tk.END, "─" * 60 + "\n\n")
         self.chat_area.config(state=tk.DISABLED)
         self.chat_area.see(tk.END)
@@ -423,17 +3162,40 @@ class ChatbotGUI:
     
     def reload_data(self):
         """Recarga los datos con web scraping"""
-        self.add_message("🔄 Sistema", "Recargando datos desde web...")
-        self.search_engine.setup_knowledge_base()
-        self.add_message("✅ Sistema", f"Datos recargados: {len(self.search_engine.knowledge_base)} oraciones disponibles")
+        if self.reloading:
+            self.add_message("⏳ Sistema", "Ya hay una recarga en curso...")
+            return
+        
+        self.reloading = True
+        self.add_message("🔄 Sistema", "Recargando datos desde web... (puedes seguir preguntando)")
+        self.reload_worker.submit(self.search_engine.reload_knowledge_base, self.reload_finished)
+    
+    def warm_up_finished(self, _):
+        """Avisa que la base terminó de cargarse"""
+        self.reloading = False
+        self.add_message("✅ Sistema", f"Base lista: {len(self.search_engine.state)} oraciones disponibles")
+    
+    def reload_finished(self, _):
+        """Avisa que la nueva base ya reemplazó a la anterior"""
+        self.reloading = False
+        self.add_message("✅ Sistema", f"Datos recargados: {len(self.search_engine.state)} oraciones disponibles")
+    
+    def show_error(self, error):
+        """Muestra un error ocurrido en segundo plano"""
+        self.reloading = False
+        self.add_message("❌ Sistema", f"Error: {error}")
     
     def show_info(self):
         """Muestra información del sistema"""
+        cache_stats = self.search_engine.cache.stats()
+        latency = self.search_engine.metrics.stats()
         info_text = f"""
 🤖 **SISTEMA DE BÚSQUEDA CON WEB SCRAPING**
 
 📊 **Estadísticas:**
-• Oraciones en base: {len(self.search_engine.knowledge_base)}
+• Oraciones en base: {self.search_engine.store.live} ({self.search_engine.store.nbytes / 2 ** 20:.1f} MB)
+• Caché de consultas: {cache_stats['hits']} aciertos / {cache_stats['misses']} fallos
+• Latencia: p50 {latency['p50_ms']:.2f} ms / p95 {latency['p95_ms']:.2f} ms en {latency['searches']} búsquedas
 • Fuentes web: {len(SCRAPING_URLS)} sitios
 • Motor: Búsqueda híbrida (semántica + keywords)
 
@@ -455,31 +3217,12 @@ class ChatbotGUI:
     
     def show_examples(self):
         """Muestra ejemplos de consultas"""
-        examples = """
+        sections = "\n\n".join(f"**{section}:**\n" + "\n".join(f"• {query}" for query in queries)
+                                 for section, queries in EXAMPLE_QUERIES.items())
+        examples = f"""
 🔍 **CONSULTAS DE EJEMPLO - TODAS FUNCIONAN:**
 
-**Consultas Sencillas:**
-• jaguar
-• condor
-• oso andino
-• animales peligro
-• amazonia
-• parques nacionales
-
-**Consultas Elaboradas:**
-• ¿Dónde vive el jaguar en Bolivia?
-• Características del cóndor andino
-• Hábitat del oso andino en los Yungas
-• Especies en peligro de extinción
-• Animales de la Amazonía boliviana
-• Flora del altiplano andino
-
-**Consultas Técnicas:**
-• Estado de conservación del armadillo gigante
-• Especies endémicas del Lago Titicaca
-• Biodiversidad del Parque Nacional Madidi
-• Aves migratorias de Bolivia
-• Plantas medicinales de los Yungas
+{sections}
 
 ¡Prueba alguna ahora! 🚀
 """
@@ -488,12 +3231,78 @@ class ChatbotGUI:
 def main():
     """Función principal"""
     try:
+        import_tkinter()
         root = tk.Tk()
         app = ChatbotGUI(root)
         root.mainloop()
+        app.memory.log.close()
     except Exception as e:
         print(f"Error: {e}")
         input("Presiona Enter para salir...")
 
+def stop_server(signum, frame):
+    """Convierte SIGTERM en una salida ordenada del proceso principal"""
+    raise KeyboardInterrupt
+
+def main_server(argv=None):
+    """Servicio HTTP sin interfaz gráfica: carga el índice una vez y lo comparte entre procesos"""
+    parser = argparse.ArgumentParser(description="Servicio de búsqueda de biodiversidad")
+    parser.add_argument('--server', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help="Procesos que comparten el índice (solo con fork)")
+    parser.add_argument('--scoring-mode', default='bm25', choices=SearchEngine.SCORING_MODES)
+    parser.add_argument('--metrics-log', action='store_true',
+                        help="Escribe en stderr una línea JSON por búsqueda con la latencia de cada etapa")
+    parser.add_argument('--warm-start', action='store_true',
+                        help="Atiende de inmediato con el último snapshot y termina de cargar en segundo plano "
+                             "(un solo proceso)")
+    args = parser.parse_args(argv)
+    
+    metrics_hook = None
+    if args.metrics_log:
+        logging.basicConfig(level=logging.INFO, format='%(message)s')
+        metrics_hook = lambda record: logger.info(json.dumps(record, ensure_ascii=False))
+    
+    # El índice se construye antes del fork: los hijos lo comparten en modo copy-on-write
+    search_engine = SearchEngine(scoring_mode=args.scoring_mode, metrics_hook=metrics_hook,
+                                 autoload=not args.warm_start)
+    if args.warm_start:
+        # Los hijos de un fork no verían la base que termina de cargarse en el hilo del padre
+        args.workers = 1
+        threading.Thread(target=search_engine.warm_up, daemon=True).start()
+    server = make_search_server(SearchService(search_engine), args.host, args.port)
+    
+    children = []
+    if hasattr(os, 'fork'):
+        for _ in range(args.workers - 1):
+            pid = os.fork()
+            if pid == 0:
+                try:
+                    server.serve_forever()
+                except KeyboardInterrupt:
+                    pass
+                finally:
+                    os._exit(0)
+            children.append(pid)
+    
+    print(f"🌐 Servicio en http://{args.host}:{args.port} ({len(children) + 1} procesos)")
+    signal.signal(signal.SIGTERM, stop_server)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except OSError:
+                pass
+        server.server_close()
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    if '--server' in sys.argv[1:]:
+        main_server()
+    else:
+        main()
\ No newline at end of file
@@ -0,0 +1,46 @@
+"""Memoria de conversación: resolución de preguntas de seguimiento con el índice de entidades
+
+Uso:
+    python -m pytest tests
+    python -m unittest discover tests
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chatbot_biodiversidad import ConversationMemory, SearchEngine, SearchHit, SearchResult
+
+SENTENCES = [
+    "El oso andino o jucumari habita en los bosques nublados de los Yungas bolivianos",
+    "El cóndor andino vive en las montañas de los Andes bolivianos",
+    "La vicuña es un camélido silvestre del Altiplano",
+]
+
+class ConversationMemoryTest(unittest.TestCase):
+    def setUp(self):
+        self.engine = SearchEngine(snapshot_path=None, pdf_paths=[], corpus_paths=[], sentences_path=None,
+                                   scrape=False, autoload=False)
+        self.engine.publish_state(self.engine.build_state((sentence, None) for sentence in SENTENCES))
+        self.memory = ConversationMemory(self.engine)
+    
+    def ask(self, question, answer=None):
+        """Registra un turno; answer fuerza la oración elegida como respuesta"""
+        result = self.engine.search(self.memory.resolve(question))
+        if answer is not None:
+            result = SearchResult(result.query, answer, 0.9, [SearchHit(1, answer, None, 1.0, {})])
+        return self.memory.record(question, result)
+    
+    def test_follow_up_uses_canonical_entity(self):
+        self.assertEqual(self.ask("Vicuñas")['entities'], ['vicuña'])
+        self.assertEqual(self.memory.resolve("¿y su hábitat?"), "¿y su hábitat? vicuña")
+    
+    def test_answer_does_not_replace_the_subject(self):
+        self.ask("oso andino")
+        # La respuesta habla del cóndor, pero la pregunta no nombra ninguna entidad
+        self.assertEqual(self.ask("¿dónde vive?", SENTENCES[1])['entities'], [])
+        self.assertEqual(self.memory.resolve("y su alimentación"), "y su alimentación oso andino")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+"""Corrección ortográfica en el modo bm25: la consulta corregida responde y se informa la palabra del corpus
+
+Uso:
+    python -m pytest tests
+    python -m unittest discover tests
+"""
+import contextlib
+import io
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chatbot_biodiversidad import SearchEngine, SourceInfo
+
+SENTENCES = [
+    "La rana gigante del Lago Titicaca es endémica de esta región",
+    "La vicuña es un camélido silvestre del altiplano boliviano protegido por ley",
+    "El tapir es el mamífero terrestre más grande de la Amazonía boliviana",
+    "El jaguar es el felino más grande de América y habita en la Amazonía boliviana",
+    "El cóndor andino es considerado el ave nacional de Bolivia",
+    "El armadillo gigante está en peligro de extinción en el Chaco boliviano",
+    # Segunda mención: solo se proponen raíces de al menos MIN_CORRECTION_DF documentos
+    "Las totoras del Titicaca dan refugio a aves y peces nativos",
+    "La fibra de vicuña es una de las más finas del mundo",
+    "El tapir dispersa semillas en los bosques de tierras bajas",
+    "El jaguar caza de noche en los bosques del Beni",
+]
+
+class CorrectionTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.engine = SearchEngine(snapshot_path=None, pdf_paths=[], corpus_paths=[], sentences_path=None,
+                                  scrape=False, autoload=False)
+        pairs = [(sentence, SourceInfo("https://example.org/biodiversidad")) for sentence in SENTENCES]
+        with contextlib.redirect_stdout(io.StringIO()):
+            cls.engine.sync_documents(pairs)
+        cls.engine.build_speller()
+    
+    def test_misspelling_is_answered_and_reports_the_corpus_word(self):
+        for query, word in [("tiuicaca", "titicaca"), ("vicuna", "vicuña"), ("tapri", "tapir")]:
+            with self.subTest(query=query):
+                result = self.engine.search(query)
+                self.assertEqual(result.corrections, {query: word})
+                self.assertGreater(result.confidence, self.engine.MIN_CONFIDENCE)
+                self.assertIn(word, result.hits[0].sentence.lower())
+    
+    def test_correction_is_penalized_once(self):
+        # El máximo teórico usa la corrección con su mismo peso: solo queda la penalización
+        written = self.engine.search("jaguar")
+        result = self.engine.search("jagur")
+        self.assertEqual(result.corrections, {"jagur": "jaguar"})
+        self.assertEqual(result.hits[0].sentence, written.hits[0].sentence)
+        self.assertAlmostEqual(result.confidence, written.confidence * self.engine.CORRECTION_PENALTY)
+
+if __name__ == "__main__":
+    unittest.main()
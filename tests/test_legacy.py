@@ -0,0 +1,45 @@
+"""Modo 'legacy': el puntaje aditivo 2/3/5/3 original (subcadenas sobre texto plegado, sin raíces ni entidades)
+
+Uso:
+    python -m pytest tests
+    python -m unittest discover tests
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chatbot_biodiversidad import SearchEngine
+
+SENTENCES = [
+    "El oso andino habita en los bosques nublados de los Yungas bolivianos",
+    "Los osos andinos comen frutos y bromelias en los bosques",
+    "El jaguar es el felino más grande de América y habita en la Amazonía boliviana",
+]
+
+class LegacyScoringTest(unittest.TestCase):
+    def setUp(self):
+        self.engine = SearchEngine('legacy', snapshot_path=None, pdf_paths=[], corpus_paths=[],
+                                   sentences_path=None, scrape=False, autoload=False)
+        self.engine.publish_state(self.engine.build_state((sentence, None) for sentence in SENTENCES))
+    
+    def test_additive_score(self):
+        # oso -> {oso, jucumari, andino}: 2 palabras (4) + frase (3) + especie "oso" (5) + región "andino" (3)
+        ranked = self.engine.search_top_k("Oso andino", 3)
+        self.assertEqual(ranked, [(SENTENCES[0], 15), (SENTENCES[1], 15)])
+        result = self.engine.search("Oso andino")
+        self.assertEqual(result.hits[0].components, {'palabras': 4, 'frase': 3, 'especies': 5, 'regiones': 3})
+        self.assertEqual(result.confidence, 1.0)  # 15 / (3 palabras * 2 + 8)
+    
+    def test_substrings_without_stems_or_corrections(self):
+        # "jaguares" no es subcadena de "jaguar"; tampoco se corrige "jagur"
+        self.assertEqual(self.engine.search_top_k("jaguares"), [])
+        result = self.engine.search("jagur")
+        self.assertEqual(result.corrections, {})
+        self.assertEqual(result.hits, [])
+        # "amazonia" (2) + frase (3) + región (3); "condor" no aparece y no suma el bonus de especie
+        self.assertEqual(self.engine.search_top_k("Cóndor del Amazonia"), [(SENTENCES[2], 8)])
+
+if __name__ == "__main__":
+    unittest.main()
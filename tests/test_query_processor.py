@@ -0,0 +1,46 @@
+"""Normalización compartida por el índice y las consultas: plegado, stopwords y raíces
+
+Uso:
+    python -m pytest tests
+    python -m unittest discover tests
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chatbot_biodiversidad import EntityIndex, QueryProcessor, TfidfScorer, import_numpy
+
+# Singular y plural (o variantes de género) que deben compartir raíz
+PAIRS = [
+    ("rana", "ranas"), ("lago", "lagos"), ("puma", "pumas"), ("mono", "monos"), ("área", "áreas"),
+    ("oso", "osos"), ("ave", "aves"), ("jaguar", "jaguares"), ("cóndor", "cóndores"), ("flor", "flores"),
+    ("animal", "animales"), ("región", "regiones"), ("especie", "especies"), ("bosque", "bosques"),
+    ("andino", "andinas"), ("amenazado", "amenazadas"), ("vicuña", "vicuñas"), ("río", "ríos")
+]
+
+class QueryProcessorTest(unittest.TestCase):
+    def setUp(self):
+        self.processor = QueryProcessor()
+    
+    def test_singular_and_plural_share_a_stem(self):
+        for singular, plural in PAIRS:
+            with self.subTest(singular=singular, plural=plural):
+                self.assertEqual(self.processor.tokenize(singular), self.processor.tokenize(plural))
+    
+    def test_plural_query_matches_singular_alias(self):
+        entities = EntityIndex(self.processor.tokenize)
+        facets = entities.match(self.processor.tokenize("ranas gigantes del lago"))
+        self.assertEqual(facets.get('especies'), [('especies', 'rana gigante del Titicaca')])
+    
+    def test_tokenize_folds_accents_and_drops_stopwords(self):
+        self.assertEqual(self.processor.tokenize("¿Dónde vive el Cóndor?"), ["viv", "condor"])
+    
+    @unittest.skipIf(import_numpy() is None, "el modo 'tfidf' requiere NumPy")
+    def test_tfidf_ngrams_use_the_same_folding(self):
+        grams = TfidfScorer(ngram_range=(7, 7)).ngrams("Vicuña del Cóndor")
+        self.assertEqual(set(grams), {' vicuña', 'vicuña ', ' condor', 'condor '})
+
+if __name__ == "__main__":
+    unittest.main()
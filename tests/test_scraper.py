@@ -0,0 +1,156 @@
+"""Etapa de descarga contra un servidor HTTP local: GET condicionales, 304, reintentos y caché sin red
+
+Uso:
+    python -m pytest tests
+    python -m unittest discover tests
+"""
+import contextlib
+import io
+import os
+import socket
+import sys
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chatbot_biodiversidad import WebScraper
+
+PAGE = """<html><body><div class="mw-parser-output">
+<p>El jaguar es el felino más grande de América y habita en la Amazonía boliviana desde hace milenios.</p>
+<p>El cóndor andino es el ave voladora más grande del mundo y un símbolo de Bolivia y de los Andes.</p>
+<p>Texto corto sin interés.</p>
+</div></body></html>""".encode('utf-8')
+ETAG = '"v1"'
+LAST_MODIFIED = 'Tue, 01 Sep 2026 10:00:00 GMT'
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Responde según la ruta; cada petición queda registrada con sus cabeceras en server.requests"""
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests.append((self.path, dict(self.headers)))
+            count = sum(1 for path, _ in server.requests if path == self.path)
+        
+        if self.path == '/flaky' and count == 1:
+            self.send_response(503)
+            self.end_headers()
+            return
+        if self.path == '/page' and self.headers.get('If-None-Match') == ETAG:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(PAGE)))
+        if self.path == '/page':
+            self.send_header('ETag', ETAG)
+            self.send_header('Last-Modified', LAST_MODIFIED)
+        self.end_headers()
+        self.wfile.write(PAGE)
+    
+    def log_message(self, format, *args):
+        pass
+
+def quiet(func, *args):
+    """Ejecuta func sin los mensajes de progreso del scraper"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        return func(*args)
+
+def closed_port():
+    """Puerto local en el que no escucha nadie"""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+class CountingScraper(WebScraper):
+    """WebScraper que cuenta las páginas que llega a procesar"""
+    def __init__(self, *args, **kwargs):
+        self.parsed = 0
+        super().__init__(*args, **kwargs)
+    
+    def parse_html(self, content):
+        self.parsed += 1
+        return super().parse_html(content)
+
+class FetchStageTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+        cls.server.lock = threading.Lock()
+        cls.server.requests = []
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+        cls.base = f"http://127.0.0.1:{cls.server.server_address[1]}"
+    
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+    
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache_path = os.path.join(self.directory.name, 'scraping_cache.json')
+        with self.server.lock:
+            self.server.requests.clear()
+    
+    def tearDown(self):
+        self.directory.cleanup()
+    
+    def make_scraper(self, *paths, urls=None):
+        return CountingScraper(urls or [self.base + path for path in paths], cache_path=self.cache_path,
+                               timeout=2, retries=2, backoff=0)
+    
+    def headers_of(self, path):
+        with self.server.lock:
+            return [headers for request_path, headers in self.server.requests if request_path == path]
+    
+    def test_conditional_get_and_304_skip_parsing(self):
+        url = self.base + '/page'
+        first = self.make_scraper('/page')
+        pairs, answered = quiet(first.scrape_all)
+        self.assertEqual(answered, 1)
+        self.assertEqual(first.parsed, 1)
+        sentences = [sentence for sentence, _ in pairs]
+        self.assertEqual(len(sentences), 2)
+        self.assertTrue(all(source.url == url for _, source in pairs))
+        self.assertNotIn('If-None-Match', self.headers_of('/page')[0])
+        
+        # Un scraper nuevo lee la caché guardada y envía las cabeceras condicionales
+        second = self.make_scraper('/page')
+        pairs, answered = quiet(second.scrape_all)
+        headers = self.headers_of('/page')[1]
+        self.assertEqual(headers.get('If-None-Match'), ETAG)
+        self.assertEqual(headers.get('If-Modified-Since'), LAST_MODIFIED)
+        self.assertEqual(answered, 1)
+        self.assertEqual(second.parsed, 0)
+        self.assertEqual([sentence for sentence, _ in pairs], sentences)
+    
+    def test_retries_after_server_error(self):
+        scraper = self.make_scraper('/flaky')
+        pairs, answered = quiet(scraper.scrape_all)
+        self.assertEqual(len(self.headers_of('/flaky')), 2)
+        self.assertEqual(answered, 1)
+        self.assertEqual(scraper.parsed, 1)
+        self.assertEqual(len(pairs), 2)
+    
+    def test_dead_host_falls_back_to_cache(self):
+        live = self.make_scraper('/page')
+        cached = [sentence for sentence, _ in quiet(live.scrape_all)[0]]
+        
+        # La misma caché bajo la URL de un host caído
+        dead_url = f"http://127.0.0.1:{closed_port()}/page"
+        scraper = self.make_scraper(urls=[dead_url])
+        scraper.cache = {dead_url: live.cache[self.base + '/page']}
+        pairs, answered = quiet(scraper.scrape_all)
+        self.assertEqual(answered, 0)
+        self.assertEqual(scraper.parsed, 0)
+        self.assertEqual([sentence for sentence, _ in pairs], cached)
+        self.assertTrue(all(source.url == dead_url for _, source in pairs))
+        # La entrada de caché de la fuente caída se conserva para el próximo intento
+        self.assertEqual(scraper.cache[dead_url]['etag'], ETAG)
+
+if __name__ == "__main__":
+    unittest.main()
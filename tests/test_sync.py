@@ -0,0 +1,163 @@
+"""Recargas incrementales sobre un snapshot (sin red): altas, cambios, bajas, casi-duplicados y compactación
+
+Uso:
+    python -m pytest tests
+    python -m unittest discover tests
+"""
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chatbot_biodiversidad import SearchEngine, SourceInfo
+
+URL = "https://example.org/biodiversidad"
+RANA = ('especies', 'rana gigante del Titicaca')
+
+BASE = [
+    "El jaguar es el felino más grande de América y habita en la Amazonía boliviana",
+    "El cóndor andino vive en las montañas de los Andes bolivianos y planea sobre el Altiplano",
+    "La vicuña es un camélido silvestre del Altiplano protegido en la Reserva Ulla Ulla",
+    "El delfín rosado habita en los ríos de la Amazonía boliviana y está amenazado",
+    "La paraba frente roja es una ave endémica de Bolivia en peligro crítico de extinción",
+    "El armadillo gigante está en peligro de extinción en el Chaco boliviano",
+    "El Parque Nacional Madidi alberga jaguares, osos andinos y miles de especies de aves",
+    "La rana gigante del Lago Titicaca es una especie endémica en peligro de extinción",
+]
+
+# Una alta por recarga, sin casi-duplicados entre ellas
+ARRIVALS = [
+    "El gato andino es un felino pequeño y escaso que vive en las rocas del Altiplano",
+    "El flamenco andino anida en las lagunas saladas del sudoeste de Potosí",
+    "El caimán negro recupera sus poblaciones en los ríos del Beni",
+    "La puya raimondi florece una sola vez tras un siglo en las laderas de la puna",
+    "El águila harpía caza monos y perezosos en el dosel de la selva amazónica",
+    "La taruca es un ciervo andino amenazado que pasta en los valles secos",
+]
+
+def quiet(func, *args):
+    """Ejecuta func sin los mensajes de progreso del motor"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        return func(*args)
+
+def make_engine(snapshot_path):
+    """Motor sin red ni fuentes locales: solo ve lo que el test le entrega"""
+    return SearchEngine(snapshot_path=snapshot_path, pdf_paths=[], corpus_paths=[], sentences_path=None,
+                        scrape=False, autoload=False)
+
+def pairs(sentences):
+    return [(sentence, SourceInfo(URL)) for sentence in sentences]
+
+def postings_by_sentence(state):
+    """Postings del índice con oraciones en lugar de doc_ids (comparables entre generaciones)"""
+    return {term: {state.store[doc_id]: tf for doc_id, tf in postings.items()}
+            for term, postings in state.index.postings.items()}
+
+def entities_by_sentence(state):
+    """Postings de entidades con oraciones en lugar de doc_ids"""
+    return {entity: {state.store[doc_id] for doc_id in doc_ids}
+            for entity, doc_ids in state.entities.postings.items() if doc_ids}
+
+def live_sentences(state):
+    return sorted(sentence for sentence in state.store if sentence is not None)
+
+class IncrementalSyncTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.snapshot_path = os.path.join(self.directory.name, 'snapshot.json')
+        builder = make_engine(self.snapshot_path)
+        quiet(builder.sync_documents, pairs(BASE))
+        quiet(builder.save_snapshot)
+        
+        self.engine = make_engine(self.snapshot_path)
+        self.assertTrue(quiet(self.engine.load_snapshot))
+    
+    def tearDown(self):
+        self.directory.cleanup()
+    
+    def assert_matches_rebuild(self, state, sentences):
+        """La generación incremental indexa lo mismo que una construida desde cero"""
+        rebuilt = make_engine(None).build_state(pairs(sentences))
+        self.assertEqual(live_sentences(state), live_sentences(rebuilt))
+        self.assertEqual(state.store.live, len(sentences))
+        self.assertEqual(state.index.size, len(sentences))
+        self.assertEqual(postings_by_sentence(state), postings_by_sentence(rebuilt))
+        self.assertEqual(entities_by_sentence(state), entities_by_sentence(rebuilt))
+    
+    def test_add_change_delete(self):
+        old = self.engine.state
+        old_sentences = live_sentences(old)
+        old_postings = postings_by_sentence(old)
+        old_entities = entities_by_sentence(old)
+        
+        # Baja de la rana, cambio en la vicuña (baja + alta) y alta de la taruca
+        changed = BASE[2].replace("Ulla Ulla", "Sajama")
+        added = "La taruca es un ciervo andino amenazado que vive en los valles del Altiplano"
+        current = [sentence for sentence in BASE if sentence not in (BASE[2], BASE[7])] + [changed, added]
+        self.assertEqual(quiet(self.engine.sync_documents, pairs(current)), (2, 2))
+        
+        new = self.engine.state
+        self.assertIsNot(new, old)
+        self.assert_matches_rebuild(new, current)
+        vicuna = new.entities.postings[('especies', 'vicuña')]
+        self.assertEqual({new.store[doc_id] for doc_id in vicuna}, {changed})
+        self.assertNotIn(RANA, entities_by_sentence(new))
+        self.assertIn(RANA, entities_by_sentence(old))
+        
+        # La generación anterior sigue intacta para las búsquedas en curso
+        self.assertEqual(old.store.live, len(BASE))
+        self.assertEqual(old.index.size, len(BASE))
+        self.assertEqual(live_sentences(old), old_sentences)
+        self.assertEqual(postings_by_sentence(old), old_postings)
+        self.assertEqual(entities_by_sentence(old), old_entities)
+        
+        # Sin cambios no se publica una generación nueva
+        self.assertEqual(quiet(self.engine.sync_documents, pairs(current)), (0, 0))
+        self.assertIs(self.engine.state, new)
+    
+    def test_near_duplicate_returns_when_its_representative_is_deleted(self):
+        # Más corta que el original: queda suprimida en lugar de reemplazarlo
+        duplicate = "El jaguar es el felino más grande de América y habita en la Amazonía"
+        self.assertEqual(quiet(self.engine.sync_documents, pairs(BASE + [duplicate])), (0, 0))
+        self.assertNotIn(duplicate, live_sentences(self.engine.state))
+        
+        # Al desaparecer el original, el casi-duplicado suprimido entra en la siguiente recarga
+        current = BASE[1:] + [duplicate]
+        self.assertEqual(quiet(self.engine.sync_documents, pairs(current)), (1, 1))
+        self.assert_matches_rebuild(self.engine.state, current)
+    
+    def test_build_replaces_near_duplicate_as_it_arrives(self):
+        # La copia más completa llega después y reemplaza a la ya indexada sin esperar al final del flujo
+        shorter = "El jaguar es el felino más grande de América y habita en la Amazonía"
+        engine = make_engine(None)
+        state = engine.build_state(iter(pairs([shorter] + BASE)), engine.dedup)
+        self.assertEqual(engine.dedup.removed, 1)
+        self.assertEqual(state.deleted, 0)
+        self.assert_matches_rebuild(state, BASE)
+    
+    def test_repeated_reloads_compact(self):
+        current = list(BASE)
+        compactions = 0
+        for arrival in ARRIVALS:
+            current = current[1:] + [arrival]
+            self.assertEqual(quiet(self.engine.sync_documents, pairs(current)), (1, 1))
+            state = self.engine.state
+            compactions += not state.deleted
+            self.assertLessEqual(state.deleted, self.engine.MAX_DELETED_RATIO * len(state.store))
+            self.assert_matches_rebuild(state, current)
+        
+        self.assertGreater(compactions, 0)
+        
+        # Lo guardado tras varias recargas (y compactaciones) se vuelve a cargar igual
+        quiet(self.engine.save_snapshot)
+        reloaded = make_engine(self.snapshot_path)
+        self.assertTrue(quiet(reloaded.load_snapshot))
+        self.assert_matches_rebuild(reloaded.state, current)
+        self.assertEqual(reloaded.search(current[-1]).hits[0].sentence, current[-1])
+
+if __name__ == "__main__":
+    unittest.main()